@@ -1,65 +1,863 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from PIL import Image
 import numpy as np
 import io
 import json
-from optimized_mosaic_generator import OptimizedMosaicGenerator
-from fixed_pdf_generator import FixedPDFGenerator
+import logging
+import os
+import threading
+import time
+import zipfile
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, wait
+from werkzeug.utils import secure_filename
+from optimized_mosaic_generator import OptimizedMosaicGenerator, ImageTooLargeError
+from instrumentation import PROFILE_MODES, RequestProfiler, StageTimer, timed_stage
+from fixed_pdf_generator import CubeInstructionLayout, FixedPDFGenerator
+from mosaic_result import RESULT_FORMATS
+import preview
+import serialization
+from palettes import PALETTES, get_palette
+from color_metrics import METRICS, get_metric
+from dithering import DITHER_MODES
+from artifact_store import ArtifactStore
+from result_cache import MosaicResultCache, MosaicStore, UploadStore, WorkingImage, pack_result, unpack_result
+from job_queue import JobQueue, QueueFullError, batch_item_job, decode_job, mosaic_job, pdf_job
+
+logging.basicConfig(
+    level=os.environ.get('MOSAIC_LOG_LEVEL', 'INFO').upper(),
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
 CORS(app)
 
-mosaic_gen = OptimizedMosaicGenerator()
+# ?profile=cprofile,tracemalloc (or ?profile=1 for both) is only honoured
+# when MOSAIC_ALLOW_PROFILING is set, as capturing slows requests down
+ALLOW_PROFILING = os.environ.get('MOSAIC_ALLOW_PROFILING', '').lower() in ('1', 'true', 'yes')
+
+# Set MOSAIC_LUT_BITS (e.g. 8 for the exact 256^3 table, 6 for 64^3) to
+# match colors through a precomputed, memory-mapped lookup table
+lut_bits = int(os.environ.get('MOSAIC_LUT_BITS', 0)) or None
+
+# MOSAIC_QUANTIZE_WORKERS > 1 quantizes large mosaics in parallel bands
+quantize_workers = int(os.environ.get('MOSAIC_QUANTIZE_WORKERS', 1))
+
+# Uploads above MOSAIC_MAX_INPUT_PIXELS are rejected before decoding
+max_input_pixels = int(os.environ.get('MOSAIC_MAX_INPUT_PIXELS', 64_000_000))
+
+# Mosaics may be at most MOSAIC_MAX_CUBES cubes wide and high
+MAX_CUBES = int(os.environ.get('MOSAIC_MAX_CUBES', 512))
+
+# Palette and distance metric used when a request doesn't choose one
+mosaic_gen = OptimizedMosaicGenerator(
+    lookup_table_bits=lut_bits,
+    quantize_workers=quantize_workers,
+    max_input_pixels=max_input_pixels,
+    palette=os.environ.get('MOSAIC_PALETTE') or None,
+    metric=os.environ.get('MOSAIC_DISTANCE_METRIC') or None
+)
 pdf_gen = FixedPDFGenerator()
 
+# MOSAIC_PREBUILD_TABLES builds (or loads) the lookup tables of every
+# registered palette and metric in the background at startup, instead of
+# in the first request that picks each one
+if os.environ.get('MOSAIC_PREBUILD_TABLES', '').lower() in ('1', 'true', 'yes'):
+    threading.Thread(target=mosaic_gen.prebuild_palette_tables,
+                     name='prebuild-palette-tables', daemon=True).start()
+
+# Repeated generate clicks on the same upload are served from this cache.
+# MOSAIC_CACHE_DIR enables the on-disk tier shared by all workers.
+result_cache = MosaicResultCache(
+    max_memory_bytes=int(os.environ.get('MOSAIC_CACHE_MAX_MB', 64)) * 1024 * 1024,
+    disk_dir=os.environ.get('MOSAIC_CACHE_DIR') or None,
+    max_disk_bytes=int(os.environ.get('MOSAIC_CACHE_DISK_MAX_MB', 512)) * 1024 * 1024
+)
+
+# Results addressable by the mosaicId returned from /api/generate-mosaic,
+# so /api/generate-pdf doesn't need the whole grid posted back
+mosaic_store = MosaicStore(
+    ttl=int(os.environ.get('MOSAIC_STORE_TTL', 3600)),
+    max_bytes=int(os.environ.get('MOSAIC_STORE_MAX_MB', 128)) * 1024 * 1024
+)
+
+# MOSAIC_ARTIFACT_DIR keeps results and rendered guides on disk, so every
+# worker process can serve them by mosaicId, also after a restart
+artifact_dir = os.environ.get('MOSAIC_ARTIFACT_DIR') or None
+artifact_store = ArtifactStore(
+    artifact_dir,
+    max_bytes=int(os.environ.get('MOSAIC_ARTIFACT_MAX_MB', 1024)) * 1024 * 1024,
+    rescan_interval=float(os.environ.get('MOSAIC_ARTIFACT_RESCAN_SECONDS', 300))
+) if artifact_dir else None
+
+# Decoded working copies of uploads, addressed by the uploadId returned
+# from /api/generate-mosaic, so regenerating with new dimensions or
+# settings skips the upload, decode and pre-reduce stages
+upload_store = UploadStore(
+    ttl=int(os.environ.get('MOSAIC_UPLOAD_TTL', 1800)),
+    max_bytes=int(os.environ.get('MOSAIC_UPLOAD_MAX_MB', 256)) * 1024 * 1024
+)
+
+# Working copies are decoded for at least this many cubes per side
+UPLOAD_WORKING_CUBES = int(os.environ.get('MOSAIC_UPLOAD_WORKING_CUBES', 64))
+
+# Background jobs run generate_mosaic/generate_pdf in a process pool;
+# submissions beyond MOSAIC_JOB_MAX_PENDING unfinished jobs get a 429
+job_queue = JobQueue(
+    max_workers=int(os.environ.get('MOSAIC_JOB_WORKERS', 0)) or None,
+    max_pending=int(os.environ.get('MOSAIC_JOB_MAX_PENDING', 0)) or None,
+    result_ttl=int(os.environ.get('MOSAIC_JOB_RESULT_TTL', 600)),
+    lut_bits=lut_bits,
+    max_input_pixels=max_input_pixels
+)
+
+# /api/batch accepts at most MOSAIC_BATCH_MAX_ITEMS images x variants
+BATCH_MAX_ITEMS = int(os.environ.get('MOSAIC_BATCH_MAX_ITEMS', 64))
+
+# Tasks per pool worker one batch may have queued or running at once
+BATCH_IN_FLIGHT_PER_WORKER = int(os.environ.get('MOSAIC_BATCH_IN_FLIGHT_PER_WORKER', 2))
+
+# Previews and tiles of a mosaicId never change, so browsers may reuse
+# them for MOSAIC_PREVIEW_MAX_AGE seconds without asking again
+PREVIEW_MAX_AGE = int(os.environ.get('MOSAIC_PREVIEW_MAX_AGE', 86400))
+
+class StreamSink(io.RawIOBase):
+    """Write-only, unseekable file whose contents are collected with drain()
+    
+    zipfile writes to unseekable files with data descriptors, so archive
+    entries can be sent to the client as soon as each one is written.
+    """
+    
+    def __init__(self):
+        self._chunks = []
+    
+    def writable(self):
+        return True
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+def read_profile_modes():
+    """Capture modes requested with ?profile=, empty when not profiling"""
+    value = request.args.get('profile', '').lower()
+    if not value:
+        return ()
+    if not ALLOW_PROFILING:
+        raise ValueError("Profiling is disabled; set MOSAIC_ALLOW_PROFILING=1 to enable it")
+    if value in ('1', 'true', 'yes', 'all'):
+        return PROFILE_MODES
+    return tuple(mode.strip() for mode in value.split(',') if mode.strip())
+
+def read_result_format():
+    """Response encoding from ?format=: legacy nested grids, or compact indices/rle"""
+    result_format = request.args.get('format', 'legacy')
+    if result_format not in RESULT_FORMATS:
+        raise ValueError(f"Unknown format '{result_format}', expected one of {', '.join(RESULT_FORMATS)}")
+    return result_format
+
+# Request options for the fused enhancement stage: form field -> (min, max)
+ENHANCEMENT_OPTIONS = {
+    'contrast': (0.0, 3.0),
+    'saturation': (0.0, 3.0),
+    'sharpen': (0.0, 500.0)
+}
+
+def read_enhancement(values=None):
+    """Enhancement overrides given in the form, validated against their ranges"""
+    values = request.form if values is None else values
+    enhancement = {}
+    for name, (low, high) in ENHANCEMENT_OPTIONS.items():
+        value = values.get(name)
+        if value is None or value == '':
+            continue
+        value = float(value)
+        if not low <= value <= high:
+            raise ValueError(f"{name} must be between {low} and {high}")
+        enhancement[name] = value
+    return enhancement
+
+def read_cube_count(values, name, default=16):
+    """Cubes per side from the form, between 1 and MAX_CUBES"""
+    try:
+        count = int(values.get(name, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{name} must be a whole number of cubes")
+    if not 1 <= count <= MAX_CUBES:
+        raise ValueError(f"{name} must be between 1 and {MAX_CUBES} cubes")
+    return count
+
+def read_mosaic_params(values=None):
+    """Generation parameters of a mosaic request
+    
+    ``values`` defaults to the request form. The parameters are keyword
+    arguments for generate_mosaic_result.
+    """
+    values = request.form if values is None else values
+    palette = get_palette(values.get('palette') or mosaic_gen.palette.name)
+    metric = values.get('metric') or mosaic_gen.distance_metric
+    get_metric(metric)
+    dither = values.get('dither') or 'none'
+    if dither not in DITHER_MODES:
+        raise ValueError(f"Unknown dither mode '{dither}', expected one of {', '.join(DITHER_MODES)}")
+    return {
+        'width': read_cube_count(values, 'width'),
+        'height': read_cube_count(values, 'height'),
+        'enhancement': read_enhancement(values),
+        'palette': palette.name,
+        'metric': metric,
+        'dither': dither
+    }
+
+def read_upload():
+    """(upload ID, upload digest, source) of a mosaic request
+    
+    Requests either post the image, making source its bytes, or name an
+    earlier uploadId, making source the stored WorkingImage. The digest
+    is None when that upload is unknown or has expired.
+    """
+    if 'image' in request.files:
+        image_bytes = request.files['image'].read()
+        upload_digest = MosaicResultCache.digest(image_bytes)
+        return UploadStore.make_id(upload_digest), upload_digest, image_bytes
+    
+    upload_id = request.form.get('uploadId')
+    if not upload_id:
+        raise ValueError("No image file or uploadId provided")
+    working = upload_store.get(upload_id)
+    if working is None:
+        return upload_id, None, None
+    return upload_id, working.upload_digest, working
+
+def reuse_working_copy(upload_id, source, params):
+    """Stored working copy of posted bytes, if it covers ``params``
+    
+    Re-uploading an image then skips decoding, and never replaces a
+    larger working copy with a smaller one.
+    """
+    if isinstance(source, bytes):
+        working = upload_store.get(upload_id)
+        if working is not None and working.covers(params['width'], params['height']):
+            return working
+    return source
+
+def working_size(params):
+    """Cubes per side the working copy of an upload is decoded for"""
+    return max(UPLOAD_WORKING_CUBES, params['width']), max(UPLOAD_WORKING_CUBES, params['height'])
+
+def decode_size_for(source, params):
+    """Cubes per side the image a request generates from is decoded for"""
+    if isinstance(source, WorkingImage):
+        return source.decode_size
+    return working_size(params)
+
+def mosaic_cache_key(upload_digest, params, decode_size):
+    """Content cache key of an upload plus every parameter that affects the result"""
+    return MosaicResultCache.make_key(
+        upload_digest,
+        palette_colors=get_palette(params['palette']).fingerprint,
+        lut_bits=lut_bits,
+        decode_size=decode_size,
+        **params
+    )
+
+def working_image(upload_id, upload_digest, source, params, timer):
+    """Working copy to generate from, decoding and storing new uploads"""
+    if isinstance(source, WorkingImage):
+        # Regeneration from a stored upload: nothing to decode
+        timer.skip('decode', 'pre_reduce')
+        return source.image
+    
+    decode_size = working_size(params)
+    image = mosaic_gen.decode_image(io.BytesIO(source), *decode_size, timer=timer)
+    with timer.stage('pre_reduce'):
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+    upload_store.put(upload_id, WorkingImage(image, upload_digest, decode_size))
+    return image
+
+def check_upload(upload_id, source, params):
+    """404 response when a stored upload is missing or too small for ``params``"""
+    if source is None:
+        return jsonify({'error': f"Upload '{upload_id}' not found or expired, please send the image again"}), 404
+    if isinstance(source, WorkingImage) and not source.covers(params['width'], params['height']):
+        return jsonify({'error': f"Upload '{upload_id}' was decoded for smaller mosaics, "
+                                 f"please send the image again"}), 404
+    return None
+
+def store_result(cache_key, mosaic_result):
+    """Cache a new result and register it under its mosaic ID"""
+    result_cache.put(cache_key, mosaic_result)
+    return register_result(cache_key, mosaic_result)
+
+def register_result(cache_key, mosaic_result):
+    """Make a result addressable by its mosaic ID, from every worker"""
+    # Same upload and parameters always map to the same ID
+    mosaic_id = cache_key[:16]
+    if artifact_store is not None:
+        artifact_store.put_result(mosaic_id, mosaic_result)
+    return mosaic_store.put(mosaic_id, mosaic_result)
+
+def find_mosaic(mosaic_id):
+    """Result stored under ``mosaic_id`` by any worker, or None"""
+    mosaic_result = mosaic_store.get(mosaic_id)
+    if mosaic_result is None and artifact_store is not None:
+        mosaic_result = artifact_store.get_result(mosaic_id)
+        if mosaic_result is not None:
+            mosaic_store.put(mosaic_id, mosaic_result)
+    return mosaic_result
+
+def mosaic_response(mosaic_result, mosaic_id, result_format, timer=None, upload_id=None,
+                    profiler=None):
+    """JSON response written straight from the index array
+    
+    The body is compressed with gzip or deflate when the client accepts it.
+    """
+    with timed_stage(timer, 'encode'):
+        members = serialization.encode_mosaic(mosaic_result, result_format)
+    
+    extra = {'mosaicId': mosaic_id}
+    if upload_id is not None:
+        # Send this instead of the image to regenerate with new settings
+        extra['uploadId'] = upload_id
+    if profiler is not None and profiler.modes:
+        extra['profile'] = profiler.report()
+    if timer is not None:
+        # Per-stage milliseconds, so skipped work is visible to clients
+        extra['timings'] = timer.as_dict()
+    body = serialization.json_object(members, extra)
+    
+    response = Response(mimetype='application/json')
+    response.headers['Vary'] = 'Accept-Encoding'
+    encoding = request.accept_encodings.best_match(serialization.CONTENT_ENCODINGS)
+    if encoding and len(body) >= serialization.MIN_COMPRESS_BYTES:
+        with timed_stage(timer, 'compress'):
+            body = serialization.compress(body, encoding)
+        response.headers['Content-Encoding'] = encoding
+    response.set_data(body)
+    
+    if timer is not None:
+        response.headers['Server-Timing'] = timer.server_timing()
+    return response
+
+def read_pdf_settings(settings):
+    """PDF settings with the instruction layout validated up front"""
+    settings = settings or {}
+    if not isinstance(settings, dict):
+        raise ValueError("PDF settings must be an object")
+    CubeInstructionLayout.parse(settings.get('instructionLayout', '4x3'))
+    return settings
+
+def read_pdf_request():
+    """(mosaic ID, mosaic, settings) of a PDF request
+    
+    The ID is None for posted mosaic data; mosaic is None for an unknown ID.
+    Invalid settings raise ValueError.
+    """
+    data = request.get_json()
+    settings = read_pdf_settings(data.get('settings'))
+    
+    # Prefer the server-side result over a re-uploaded grid
+    mosaic_id = data.get('mosaicId')
+    if mosaic_id is not None and not isinstance(mosaic_id, str):
+        raise ValueError("mosaicId must be a string")
+    if mosaic_id:
+        return mosaic_id, find_mosaic(mosaic_id), settings
+    return None, data.get('mosaicData'), settings
+
+def send_pdf(path_or_file, timer):
+    response = send_file(
+        path_or_file,
+        as_attachment=True,
+        download_name='rubiks-mosaic-guide.pdf',
+        mimetype='application/pdf'
+    )
+    response.headers['Server-Timing'] = timer.server_timing()
+    return response
+
 @app.route('/api/generate-mosaic', methods=['POST'])
 def generate_mosaic():
     try:
-        # Get image file from request
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image file provided'}), 400
+        timer = StageTimer()
+        try:
+            result_format = read_result_format()
+            profiler = RequestProfiler(read_profile_modes())
+            params = read_mosaic_params()
+            with timer.stage('upload'):
+                upload_id, upload_digest, source = read_upload()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        image_file = request.files['image']
-        width = int(request.form.get('width', 16))
-        height = int(request.form.get('height', 16))
+        error_response = check_upload(upload_id, source, params)
+        if error_response is not None:
+            return error_response
+        source = reuse_working_copy(upload_id, source, params)
+        cache_key = mosaic_cache_key(upload_digest, params, decode_size_for(source, params))
         
-        # Open and process the image
-        image = Image.open(image_file.stream)
+        with profiler:
+            # Identical upload + parameters: skip all image processing
+            with timer.stage('cache_lookup'):
+                mosaic_result = result_cache.get(cache_key)
+            
+            if mosaic_result is None:
+                # Decode new uploads once, close to the size any mosaic needs
+                image = working_image(upload_id, upload_digest, source, params, timer)
+                
+                # Generate the mosaic
+                mosaic_result = mosaic_gen.generate_mosaic_result(image, timer=timer, **params)
+                mosaic_id = store_result(cache_key, mosaic_result)
+            else:
+                timer.skip('decode', 'pre_reduce', 'resize', 'enhance', 'quantize')
+                mosaic_id = register_result(cache_key, mosaic_result)
+                if isinstance(source, bytes) and upload_store.get(upload_id) is None:
+                    # Not decoded yet, so there is no working copy to point to
+                    upload_id = None
         
-        # Generate the mosaic
-        mosaic_data = mosaic_gen.generate_mosaic(image, width, height)
-        
-        return jsonify(mosaic_data)
+        logger.info("Mosaic %s (%dx%d cubes) timings: %s",
+                    mosaic_id, params['width'], params['height'], timer.as_dict())
+        return mosaic_response(mosaic_result, mosaic_id, result_format, timer, upload_id, profiler)
     
+    except ImageTooLargeError as e:
+        return jsonify({'error': str(e)}), 413
     except Exception as e:
-        print(f"Error generating mosaic: {e}")
+        logger.exception("Error generating mosaic")
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/generate-pdf', methods=['POST'])
 def generate_pdf():
     try:
-        data = request.get_json()
-        mosaic_data = data.get('mosaicData')
-        settings = data.get('settings')
+        timer = StageTimer()
+        try:
+            profiler = RequestProfiler(read_profile_modes())
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        try:
+            mosaic_id, mosaic_data, settings = read_pdf_request()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if mosaic_data is None:
+            return jsonify({'error': 'Mosaic not found or expired'}), 404
+        
+        path = None
+        if mosaic_id and artifact_store is not None:
+            # Guides of stored mosaics are rendered once and then served
+            # from disk by whichever worker gets the request
+            path = artifact_store.pdf_path(mosaic_id, settings)
+            if path is None:
+                artifact_store.put_result(mosaic_id, mosaic_data)
+                with profiler:
+                    path = artifact_store.put_pdf(
+                        mosaic_id, settings,
+                        lambda f: pdf_gen.generate_pdf(mosaic_data, settings, output=f, timer=timer)
+                    )
+            else:
+                timer.skip('pdf_mosaic', 'pdf_instructions', 'pdf_build')
+        
+        if path is None:
+            with profiler:
+                pdf_buffer = pdf_gen.generate_pdf(mosaic_data, settings, timer=timer)
         
-        # Generate PDF
-        pdf_buffer = pdf_gen.generate_pdf(mosaic_data, settings)
+        logger.info("PDF timings: %s", timer.as_dict())
+        if profiler.modes:
+            # The response body is the PDF, so the capture goes to the log
+            logger.info("PDF profile: %s", json.dumps(profiler.report()))
         
+        if path is not None:
+            return send_pdf(path, timer)
+        return send_pdf(pdf_buffer, timer)
+    
+    except Exception as e:
+        logger.exception("Error generating PDF")
+        return jsonify({'error': str(e)}), 500
+
+def queue_full_response(error):
+    response = jsonify({'error': str(error)})
+    response.headers['Retry-After'] = '5'
+    return response, 429
+
+@app.route('/api/jobs/mosaic', methods=['POST'])
+def submit_mosaic_job():
+    try:
+        try:
+            params = read_mosaic_params()
+            upload_id, upload_digest, source = read_upload()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        error_response = check_upload(upload_id, source, params)
+        if error_response is not None:
+            return error_response
+        source = reuse_working_copy(upload_id, source, params)
+        cache_key = mosaic_cache_key(upload_digest, params, decode_size_for(source, params))
+        
+        if isinstance(source, WorkingImage):
+            # Stored working copies travel to the worker as a plain array
+            job_args = (np.asarray(source.image), params)
+        else:
+            # The worker decodes the upload exactly as the synchronous path does
+            job_args = (source, params, working_size(params))
+        
+        def on_success(packed):
+            store_result(cache_key, unpack_result(*packed))
+        
+        job_id = job_queue.submit(
+            'mosaic', mosaic_job, *job_args,
+            on_success=on_success, cache_key=cache_key
+        )
+        return jsonify({'jobId': job_id, 'status': 'queued'}), 202
+    
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except Exception as e:
+        logger.exception("Error submitting mosaic job")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/pdf', methods=['POST'])
+def submit_pdf_job():
+    try:
+        try:
+            _, mosaic_data, settings = read_pdf_request()
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if mosaic_data is None:
+            return jsonify({'error': 'Mosaic not found or expired'}), 404
+        
+        # Stored results travel to the worker as a compact packed array
+        if not isinstance(mosaic_data, dict):
+            mosaic_data = pack_result(mosaic_data)
+        
+        job_id = job_queue.submit('pdf', pdf_job, mosaic_data, settings, job_queue.output_dir)
+        return jsonify({'jobId': job_id, 'status': 'queued'}), 202
+    
+    except QueueFullError as e:
+        return queue_full_response(e)
+    except Exception as e:
+        logger.exception("Error submitting PDF job")
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Job '{job_id}' not found or expired"}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/api/jobs/<job_id>/result', methods=['GET'])
+def job_result(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({'error': f"Job '{job_id}' not found or expired"}), 404
+    
+    state = job.state
+    if state in ('queued', 'running'):
+        return jsonify(job.to_dict()), 202
+    if state == 'failed':
+        return jsonify(job.to_dict()), 500
+    
+    if job.kind == 'pdf':
         return send_file(
-            pdf_buffer,
+            job.result,
             as_attachment=True,
             download_name='rubiks-mosaic-guide.pdf',
             mimetype='application/pdf'
         )
     
-    except Exception as e:
-        print(f"Error generating PDF: {e}")
-        return jsonify({'error': str(e)}), 500
+    try:
+        result_format = read_result_format()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    cache_key = job.meta['cache_key']
+    return mosaic_response(unpack_result(*job.result), cache_key[:16], result_format)
+
+def read_batch_request():
+    """(uploads, variants, pdf_settings) of a batch request
+    
+    Uploads are (filename, bytes, digest) for each posted ``images`` file.
+    Variants are mosaic parameters; each object in the ``variants`` JSON
+    field overrides the shared form fields. pdf_settings is None unless
+    guides were requested with ``pdf``.
+    """
+    files = request.files.getlist('images')
+    if not files:
+        raise ValueError("No images provided")
+    
+    try:
+        variants = json.loads(request.form.get('variants') or '[{}]')
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid variants JSON: {e}")
+    if not isinstance(variants, list) or not variants or \
+            not all(isinstance(variant, dict) for variant in variants):
+        raise ValueError("variants must be a non-empty list of objects")
+    if len(files) * len(variants) > BATCH_MAX_ITEMS:
+        raise ValueError(f"Batch of {len(files)} images x {len(variants)} variants "
+                         f"exceeds {BATCH_MAX_ITEMS} items")
+    
+    defaults = request.form.to_dict()
+    variants = [read_mosaic_params({**defaults, **variant}) for variant in variants]
+    
+    pdf_settings = None
+    if request.form.get('pdf', '').lower() in ('1', 'true', 'yes'):
+        pdf_settings = read_pdf_settings(json.loads(request.form.get('settings') or '{}'))
+    
+    uploads = []
+    for file in files:
+        image_bytes = file.read()
+        uploads.append((file.filename or 'image', image_bytes, MosaicResultCache.digest(image_bytes)))
+    return uploads, variants, pdf_settings
+
+def batch_archive(uploads, variants, result_format, pdf_settings, window):
+    """Yield a zip of every upload x variant, entry by entry as results finish
+    
+    Each upload is decoded once, in a worker, for the largest variant; the
+    variants then fan out across the pool. Cached results skip both steps.
+    At most ``window`` tasks, reserved in the job queue by the caller, are
+    in the pool at once. manifest.json, written last, lists every item and
+    any per-item error.
+    """
+    started = time.perf_counter()
+    sink = StreamSink()
+    items = []
+    backlog = deque()  # (kind, context, func, args) not yet handed to the pool
+    running = {}  # future -> (kind, context)
+    
+    def submit(kind, context, func, *args):
+        backlog.append((kind, context, func, args))
+    
+    def fill():
+        while backlog and len(running) < window:
+            kind, context, func, args = backlog.popleft()
+            running[job_queue.execute(func, *args)] = (kind, context)
+    
+    def submit_item(item, source, params, cache_key):
+        settings = None
+        if pdf_settings is not None:
+            settings = {**pdf_settings, 'width': params['width'], 'height': params['height']}
+        submit('item', (item, cache_key), batch_item_job, source, params, result_format, settings)
+    
+    def finish_decode(future, upload_id, upload_digest, image_size, misses):
+        try:
+            array = future.result()
+        except Exception as e:
+            for item, _, _ in misses:
+                item['error'] = str(e) or e.__class__.__name__
+            return
+        upload_store.put(upload_id, WorkingImage(Image.fromarray(array), upload_digest, image_size))
+        for item, params, cache_key in misses:
+            item['uploadId'] = upload_id
+            submit_item(item, array, params, cache_key)
+    
+    def finish_item(future, archive, item, cache_key):
+        try:
+            packed, members, pdf = future.result()
+        except Exception as e:
+            item['error'] = str(e) or e.__class__.__name__
+            return
+        
+        mosaic_result = unpack_result(*packed)
+        if item['cached']:
+            item['mosaicId'] = register_result(cache_key, mosaic_result)
+        else:
+            item['mosaicId'] = store_result(cache_key, mosaic_result)
+        
+        extra = {'mosaicId': item['mosaicId']}
+        if 'uploadId' in item:
+            extra['uploadId'] = item['uploadId']
+        archive.writestr(f"{item['path']}.json", serialization.json_object(members, extra),
+                         compress_type=zipfile.ZIP_DEFLATED)
+        item['files'] = [f"{item['path']}.json"]
+        if pdf is not None:
+            # PDF streams are compressed already
+            archive.writestr(f"{item['path']}.pdf", pdf)
+            item['files'].append(f"{item['path']}.pdf")
+    
+    try:
+        with zipfile.ZipFile(sink, 'w') as archive:
+            decode_size = working_size({
+                'width': max(params['width'] for params in variants),
+                'height': max(params['height'] for params in variants)
+            })
+            for image_index, (filename, image_bytes, upload_digest) in enumerate(uploads):
+                stem = secure_filename(os.path.splitext(filename)[0]) or 'image'
+                upload_id = UploadStore.make_id(upload_digest)
+                working = upload_store.get(upload_id)
+                image_size = decode_size
+                if working is not None and working.covers(*decode_size):
+                    image_size = working.decode_size
+                else:
+                    working = None
+                
+                misses = []
+                for variant_index, params in enumerate(variants):
+                    item = {
+                        'image': filename,
+                        'variant': variant_index,
+                        'path': f"{image_index + 1:02d}-{stem}/{variant_index + 1:02d}-"
+                                f"{params['width']}x{params['height']}-{params['palette']}",
+                        **{key: params[key] for key in ('width', 'height', 'palette', 'metric', 'dither')}
+                    }
+                    items.append(item)
+                    if working is not None:
+                        item['uploadId'] = upload_id
+                    
+                    cache_key = mosaic_cache_key(upload_digest, params, image_size)
+                    cached = result_cache.get(cache_key)
+                    item['cached'] = cached is not None
+                    if cached is not None:
+                        submit_item(item, pack_result(cached), params, cache_key)
+                    elif working is not None:
+                        submit_item(item, np.asarray(working.image), params, cache_key)
+                    else:
+                        misses.append((item, params, cache_key))
+                
+                if misses:
+                    submit('decode', (upload_id, upload_digest, image_size, misses),
+                           decode_job, image_bytes, *image_size)
+            
+            fill()
+            while running:
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    kind, context = running.pop(future)
+                    if kind == 'decode':
+                        finish_decode(future, *context)
+                    else:
+                        finish_item(future, archive, *context)
+                fill()
+                yield sink.drain()
+            
+            seconds = time.perf_counter() - started
+            failed = sum(1 for item in items if 'error' in item)
+            logger.info("Batch of %d items (%d failed) took %.3fs", len(items), failed, seconds)
+            manifest = {
+                'format': result_format,
+                'items': items,
+                'failed': failed,
+                'seconds': round(seconds, 3)
+            }
+            archive.writestr('manifest.json', json.dumps(manifest, indent=2),
+                             compress_type=zipfile.ZIP_DEFLATED)
+        yield sink.drain()
+    finally:
+        # Stop queued work if the client went away mid-stream
+        for future in running:
+            future.cancel()
+
+@app.route('/api/batch', methods=['POST'])
+def generate_batch():
+    try:
+        result_format = read_result_format()
+        uploads, variants, pdf_settings = read_batch_request()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # A batch keeps up to BATCH_IN_FLIGHT_PER_WORKER tasks per worker in the
+    # pool, counted against the same capacity as /api/jobs/*
+    tasks = len(uploads) * (len(variants) + 1)
+    window = min(tasks, job_queue.max_workers * BATCH_IN_FLIGHT_PER_WORKER)
+    try:
+        job_queue.reserve(window)
+    except QueueFullError as e:
+        return queue_full_response(e)
+    
+    response = Response(
+        batch_archive(uploads, variants, result_format, pdf_settings, window),
+        mimetype='application/zip',
+        headers={'Content-Disposition': 'attachment; filename=rubiks-mosaics.zip'}
+    )
+    response.call_on_close(lambda: job_queue.release(window))
+    return response
+
+def read_grid_flag():
+    return request.args.get('grid', '').lower() in ('1', 'true', 'yes')
+
+def cached_image(etag, render):
+    """PNG response with caching headers; render() only runs if the client's copy is stale"""
+    response = Response(mimetype='image/png')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = f'public, max-age={PREVIEW_MAX_AGE}'
+    if request.if_none_match.contains(etag):
+        response.status_code = 304
+        return response
+    response.set_data(render())
+    return response
+
+@app.route('/api/mosaics/<mosaic_id>/preview.png', methods=['GET'])
+def mosaic_preview(mosaic_id):
+    scale = request.args.get('scale', type=int)
+    grid = read_grid_flag()
+    mosaic = find_mosaic(mosaic_id)
+    if mosaic is None:
+        return jsonify({'error': 'Mosaic not found or expired'}), 404
+    
+    try:
+        return cached_image(f"{mosaic_id}-{scale or 'fit'}-{int(grid)}-v{preview.RENDER_VERSION}",
+                            lambda: preview.preview_png(mosaic, scale, grid))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+@app.route('/api/mosaics/<mosaic_id>/tiles', methods=['GET'])
+def mosaic_tile_layout(mosaic_id):
+    mosaic = find_mosaic(mosaic_id)
+    if mosaic is None:
+        return jsonify({'error': 'Mosaic not found or expired'}), 404
+    return jsonify(preview.tile_layout(mosaic))
+
+@app.route('/api/mosaics/<mosaic_id>/tiles/<int:level>/<int:column>/<int:row>.png', methods=['GET'])
+def mosaic_tile(mosaic_id, level, column, row):
+    grid = read_grid_flag()
+    mosaic = find_mosaic(mosaic_id)
+    if mosaic is None:
+        return jsonify({'error': 'Mosaic not found or expired'}), 404
+    
+    try:
+        etag = f"{mosaic_id}-{level}-{column}-{row}-{int(grid)}-v{preview.RENDER_VERSION}"
+        return cached_image(etag, lambda: preview.tile_png(mosaic, level, column, row, grid))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 404
+
+@app.route('/api/mosaics/<mosaic_id>/stats', methods=['GET'])
+def mosaic_stats(mosaic_id):
+    mosaic = find_mosaic(mosaic_id)
+    if mosaic is None:
+        return jsonify({'error': 'Mosaic not found or expired'}), 404
+    
+    # ?dominant=1 adds every cube's dominant palette index (H x W)
+    include_dominant = request.args.get('dominant', '').lower() in ('1', 'true', 'yes')
+    return jsonify({
+        'mosaicId': mosaic_id,
+        'palette': mosaic.palette,
+        'dimensions': mosaic.dimensions,
+        **mosaic.stats.to_dict(include_dominant)
+    })
+
+@app.route('/api/palettes', methods=['GET'])
+def list_palettes():
+    return jsonify({
+        'palettes': [palette.to_dict() for palette in PALETTES.values()],
+        'metrics': list(METRICS),
+        'dither_modes': list(DITHER_MODES),
+        'default_palette': mosaic_gen.palette.name,
+        'default_metric': mosaic_gen.distance_metric
+    })
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'healthy'})
+    return jsonify({
+        'status': 'healthy',
+        'cache': result_cache.stats(),
+        'mosaic_store': mosaic_store.stats(),
+        'upload_store': upload_store.stats(),
+        'artifacts': artifact_store.stats() if artifact_store is not None else None,
+        'jobs': job_queue.metrics()
+    })
 
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5555)
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from result_cache import pack_result, unpack_result
+
+logger = logging.getLogger(__name__)
+
+INDICES_FILE = 'indices.npy'
+META_FILE = 'meta.json'
+
+
+class ArtifactStore:
+    """Mosaic results and their PDF guides on disk, addressed by mosaic ID
+
+    Each mosaic gets a directory holding its index array as ``indices.npy``,
+    the rest of the result in ``meta.json`` and any rendered guides as
+    ``guide-<settings hash>.pdf``. Every process pointed at the same
+    ``root_dir`` sees the same artifacts, and they survive restarts.
+
+    Index arrays are memory-mapped rather than read, and PDFs are served
+    from their path, so nothing is copied into the process to serve them.
+    Files are written to a temporary name and renamed into place, with
+    meta.json last, so readers never see a partial artifact.
+
+    The least recently used mosaics are deleted once the directory exceeds
+    ``max_bytes``. Use is recorded in the mtime of meta.json, so eviction
+    order is shared by all processes. An in-memory index of sizes and last
+    use is kept up to date on every write and read; the directory is only
+    rescanned at startup and every ``rescan_interval`` seconds, to pick up
+    other processes' artifacts and use.
+    """
+
+    def __init__(self, root_dir, max_bytes=1024 * 1024 * 1024, rescan_interval=300):
+        self.root_dir = root_dir
+        self.max_bytes = max_bytes
+        self.rescan_interval = rescan_interval
+
+        self._index = {}  # mosaic ID -> [total bytes on disk, last used]
+        self._bytes = 0
+        self._scanned_at = 0.0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.pdf_hits = 0
+        self.pdf_misses = 0
+        self.evictions = 0
+
+        os.makedirs(self.root_dir, exist_ok=True)
+        self._scan()
+        # Also applies a lowered max_bytes to what earlier runs left behind
+        self._evict()
+        logger.info("Artifact store %s: %d mosaics, %d bytes",
+                    self.root_dir, len(self._index), self._bytes)
+
+    @staticmethod
+    def pdf_key(settings):
+        """Short hash of PDF settings; each distinct guide is stored once"""
+        encoded = json.dumps(settings or {}, sort_keys=True).encode('utf-8')
+        return hashlib.sha256(encoded).hexdigest()[:16]
+
+    @staticmethod
+    def _valid_id(mosaic_id):
+        return isinstance(mosaic_id, str) and mosaic_id.isalnum()
+
+    def _dir(self, mosaic_id):
+        if not self._valid_id(mosaic_id):
+            raise ValueError(f"Invalid mosaic ID '{mosaic_id}'")
+        return os.path.join(self.root_dir, mosaic_id)
+
+    def _write(self, directory, name, write):
+        """Call ``write(file)`` on a temporary file, then rename it to ``name``"""
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(tmp_path, os.path.join(directory, name))
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _touch(self, mosaic_id, directory):
+        try:
+            os.utime(os.path.join(directory, META_FILE))
+        except OSError:
+            return
+        with self._lock:
+            entry = self._index.get(mosaic_id)
+            if entry is not None:
+                entry[1] = time.time()
+                return
+        # Written by another process since the last scan
+        self._add(mosaic_id, self._dir_size(directory))
+
+    def _add(self, mosaic_id, size):
+        """Record ``size`` more bytes for ``mosaic_id``, used now"""
+        with self._lock:
+            entry = self._index.setdefault(mosaic_id, [0, 0.0])
+            entry[0] += size
+            entry[1] = time.time()
+            self._bytes += size
+
+    @staticmethod
+    def _dir_size(directory):
+        try:
+            return sum(item.stat().st_size for item in os.scandir(directory) if item.is_file())
+        except FileNotFoundError:
+            return 0
+
+    def put_result(self, mosaic_id, result):
+        """Store ``result`` unless it is stored already"""
+        directory = self._dir(mosaic_id)
+        if os.path.exists(os.path.join(directory, META_FILE)):
+            self._touch(mosaic_id, directory)
+            return
+
+        indices, meta = pack_result(result)
+        try:
+            os.makedirs(directory, exist_ok=True)
+            self._write(directory, INDICES_FILE, lambda f: np.save(f, indices))
+            self._write(directory, META_FILE, lambda f: f.write(json.dumps(meta).encode('utf-8')))
+        except OSError as e:
+            logger.warning("Could not write artifact %s: %s", mosaic_id, e)
+            return
+        self._add(mosaic_id, self._dir_size(directory))
+        self._evict()
+
+    def get_result(self, mosaic_id):
+        """Stored MosaicResult over a memory-mapped index array, or None"""
+        if not self._valid_id(mosaic_id):
+            return None
+        directory = self._dir(mosaic_id)
+        try:
+            with open(os.path.join(directory, META_FILE), 'rb') as f:
+                meta = json.loads(f.read())
+            indices = np.load(os.path.join(directory, INDICES_FILE), mmap_mode='r')
+        except FileNotFoundError:
+            with self._lock:
+                self.misses += 1
+                self._bytes -= self._index.pop(mosaic_id, [0])[0]
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring unreadable artifact %s: %s", mosaic_id, e)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        self._touch(mosaic_id, directory)
+        with self._lock:
+            self.hits += 1
+        return unpack_result(indices, meta)
+
+    def pdf_path(self, mosaic_id, settings):
+        """Path of the stored guide for ``settings``, or None"""
+        if not self._valid_id(mosaic_id):
+            return None
+        directory = self._dir(mosaic_id)
+        path = os.path.join(directory, f"guide-{self.pdf_key(settings)}.pdf")
+        found = os.path.isfile(path)
+        with self._lock:
+            if found:
+                self.pdf_hits += 1
+            else:
+                self.pdf_misses += 1
+        if found:
+            self._touch(mosaic_id, directory)
+            return path
+        return None
+
+    def put_pdf(self, mosaic_id, settings, write):
+        """Render a guide with ``write(file)`` and store it; returns its path
+
+        The result of ``mosaic_id`` must be stored already. None if the
+        guide could not be stored, e.g. because the mosaic was evicted.
+        """
+        directory = self._dir(mosaic_id)
+        name = f"guide-{self.pdf_key(settings)}.pdf"
+        path = os.path.join(directory, name)
+        try:
+            replaced = os.path.getsize(path) if os.path.isfile(path) else 0
+            self._write(directory, name, write)
+            size = os.path.getsize(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        with self._lock:
+            entry = self._index.get(mosaic_id)
+            if entry is not None:
+                entry[0] += size - replaced
+                self._bytes += size - replaced
+        # Indexes the whole directory if the mosaic was not indexed yet
+        self._touch(mosaic_id, directory)
+        self._evict()
+        return path if os.path.isfile(path) else None
+
+    def _scan(self):
+        """Rebuild the index from disk"""
+        index = {}
+        for entry in os.scandir(self.root_dir):
+            if not entry.is_dir():
+                continue
+            try:
+                size = sum(item.stat().st_size for item in os.scandir(entry.path) if item.is_file())
+                last_used = os.stat(os.path.join(entry.path, META_FILE)).st_mtime
+            except FileNotFoundError:
+                # Being written or deleted by another process
+                continue
+            index[entry.name] = [size, last_used]
+
+        with self._lock:
+            self._index = index
+            self._bytes = sum(size for size, _ in index.values())
+            self._scanned_at = time.time()
+
+    def _evict(self):
+        """Delete least recently used mosaics until under max_bytes
+
+        Works from the index. Other processes add and use artifacts too, so
+        the directory is rescanned first once the index is older than
+        ``rescan_interval``.
+        """
+        with self._lock:
+            stale = time.time() - self._scanned_at > self.rescan_interval
+        if stale:
+            self._scan()
+
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return
+            used = sorted(self._index.items(), key=lambda item: item[1][1])
+        for mosaic_id, _ in used:
+            with self._lock:
+                if self._bytes <= self.max_bytes:
+                    break
+            shutil.rmtree(os.path.join(self.root_dir, mosaic_id), ignore_errors=True)
+            with self._lock:
+                self._bytes -= self._index.pop(mosaic_id, [0])[0]
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'mosaics': len(self._index),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'pdf_hits': self.pdf_hits,
+                'pdf_misses': self.pdf_misses,
+                'evictions': self.evictions
+            }
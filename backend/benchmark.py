@@ -0,0 +1,650 @@
+"""Benchmarks for the mosaic backend.
+
+Run from the backend directory:
+
+    python benchmark.py
+    python benchmark.py --sizes 16 64 --repeat 5
+    python benchmark.py --suites pipeline --json results.json
+    python benchmark.py --suites batch --batch-workers 1 2 4
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import time
+from concurrent.futures import wait
+
+import numpy as np
+from PIL import Image
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import PageBreak, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from fixed_pdf_generator import FixedPDFGenerator
+from instrumentation import StageTimer
+from job_queue import JobQueue, batch_item_job, decode_job
+from color_metrics import METRICS
+from dithering import DITHER_MODES, ERROR_DIFFUSION_KERNELS
+from mosaic_result import RESULT_FORMATS, MosaicResult
+from optimized_mosaic_generator import OptimizedMosaicGenerator
+from palettes import PALETTES
+import preview
+import serialization
+from tests.helpers import legacy_error_diffusion, legacy_quantize, synthetic_image_array
+
+
+def synthetic_photo_jpeg(width, height, seed=0, quality=90):
+    """JPEG bytes of a photo-sized gradient with noise, as a stand-in upload"""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, np.newaxis]
+    image_array = np.empty((height, width, 3), dtype=np.uint8)
+    for channel, base in enumerate((x + 0 * y, y + 0 * x, 255 - (x + y) / 2)):
+        noise = rng.integers(-25, 26, (height, width), dtype=np.int16)
+        image_array[..., channel] = np.clip(base + noise, 0, 255)
+    buffer = io.BytesIO()
+    Image.fromarray(image_array).save(buffer, 'JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def best_of(func, repeat):
+    """Return (best wall time in seconds, last result)"""
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def bench_quantize(generator, sizes, repeat, legacy_limit):
+    print("== Palette quantization (per-pixel loop vs vectorized engine) ==")
+    print(f"{'cubes':>6} {'pixels':>9} {'legacy s':>10} {'vector s':>10} {'speedup':>9} match")
+    rows = []
+    for cubes in sizes:
+        image_array = synthetic_image_array(cubes)
+        vector_time, vector_out = best_of(
+            lambda: generator.quantize_image_array(image_array), repeat)
+
+        legacy_time = None
+        if cubes <= legacy_limit:
+            legacy_time, legacy_out = best_of(
+                lambda: legacy_quantize(generator, image_array), 1)
+            match = 'yes' if np.array_equal(legacy_out, vector_out) else 'NO'
+            legacy_col = f"{legacy_time:10.3f}"
+            speedup = f"{legacy_time / vector_time:8.1f}x"
+        else:
+            legacy_col, speedup, match = f"{'skipped':>10}", f"{'-':>9}", '-'
+
+        print(f"{cubes:>6} {image_array.shape[0] * image_array.shape[1]:>9} "
+              f"{legacy_col} {vector_time:10.4f} {speedup} {match}")
+        rows.append({'cubes': cubes, 'legacy_s': legacy_time, 'vector_s': vector_time,
+                     'match': None if legacy_time is None else match == 'yes'})
+    return rows
+
+
+def bench_lookup_table(sizes, repeat, bits, cache_dir):
+    print(f"== Lookup table gather ({1 << bits}^3 table) vs vectorized engine ==")
+    direct = OptimizedMosaicGenerator()
+    start = time.perf_counter()
+    with_lut = OptimizedMosaicGenerator(lookup_table_bits=bits, lookup_table_dir=cache_dir)
+    load_time = time.perf_counter() - start
+    print(f"table load/build: {load_time:.3f}s")
+    print(f"{'cubes':>6} {'vector s':>10} {'lut s':>10} {'speedup':>9} {'mismatch %':>11}")
+    rows = []
+    for cubes in sizes:
+        image_array = synthetic_image_array(cubes)
+        vector_time, vector_out = best_of(
+            lambda: direct.quantize_image_array(image_array), repeat)
+        lut_time, lut_out = best_of(
+            lambda: with_lut.quantize_image_array(image_array), repeat)
+        mismatch = 100.0 * np.mean(vector_out != lut_out)
+        print(f"{cubes:>6} {vector_time:10.4f} {lut_time:10.4f} "
+              f"{vector_time / lut_time:8.1f}x {mismatch:10.3f}%")
+        rows.append({'cubes': cubes, 'bits': bits, 'load_s': load_time, 'vector_s': vector_time,
+                     'lut_s': lut_time, 'mismatch_pct': float(mismatch)})
+    return rows
+
+
+def bench_palettes(sizes, repeat):
+    print("== Palettes and distance metrics (vectorized engine, no lookup table) ==")
+    generator = OptimizedMosaicGenerator()
+    print(f"{'palette':>12} {'metric':>14} {'setup ms':>9} {'reuse ms':>9} "
+          + ' '.join(f"{f'{cubes} s':>9}" for cubes in sizes))
+    images = [synthetic_image_array(cubes) for cubes in sizes]
+    rows = []
+    for palette in PALETTES:
+        for metric in METRICS:
+            # First use builds the palette tables, later uses hit the cache
+            start = time.perf_counter()
+            tables = generator.palette_tables(palette, metric)
+            setup = time.perf_counter() - start
+            start = time.perf_counter()
+            generator.palette_tables(palette, metric)
+            reuse = time.perf_counter() - start
+            times = [best_of(lambda: generator.quantize_image_array(image_array, tables=tables), repeat)[0]
+                     for image_array in images]
+            print(f"{palette:>12} {metric:>14} {setup * 1000:9.3f} {reuse * 1000:9.3f} "
+                  + ' '.join(f"{t:9.4f}" for t in times))
+            rows.extend({'palette': palette, 'metric': metric, 'cubes': cubes, 'setup_s': setup,
+                         'reuse_s': reuse, 'quantize_s': t} for cubes, t in zip(sizes, times))
+    return rows
+
+
+def bench_dither(generator, sizes, repeat, legacy_limit):
+    print("== Dithering modes vs plain nearest-color ==")
+    print(f"{'cubes':>6} {'mode':>16} {'seconds':>9} {'Mpx/s':>8} {'vs none':>8} {'reference':>9}")
+    rows = []
+    for cubes in sizes:
+        image_array = synthetic_image_array(cubes)
+        megapixels = image_array.shape[0] * image_array.shape[1] / 1e6
+        base_time = None
+        for mode in DITHER_MODES:
+            seconds, indices = best_of(lambda: generator.dither_image_array(image_array, mode), repeat)
+            base_time = base_time or seconds
+            # The per-pixel reference loop is only practical for small sizes
+            reference = '-'
+            if mode in ERROR_DIFFUSION_KERNELS and cubes <= legacy_limit:
+                expected = legacy_error_diffusion(generator, image_array, mode)
+                reference = 'match' if np.array_equal(indices, expected) else 'MISMATCH'
+            print(f"{cubes:>6} {mode:>16} {seconds:9.4f} {megapixels / seconds:8.2f} "
+                  f"{seconds / base_time:7.1f}x {reference:>9}")
+            rows.append({'cubes': cubes, 'mode': mode, 'seconds': seconds,
+                         'reference_match': None if reference == '-' else reference == 'match'})
+    return rows
+
+
+def bench_enhance(generator, sizes, repeat, tolerance):
+    """Fused NumPy enhancement vs the chained PIL passes, with a regression check"""
+    print("== Enhancement (PIL Contrast/Color/UnsharpMask vs fused NumPy) ==")
+    print(f"{'cubes':>6} {'pil s':>8} {'fused s':>8} {'speedup':>8} {'max diff':>9} "
+          f"{'mean diff':>10} {'faces same':>11}")
+    failures = 0
+    rows = []
+    for cubes in sizes:
+        image_array = synthetic_image_array(cubes)
+        pil_time, pil_out = best_of(
+            lambda: np.array(generator.enhance_image_lightweight(Image.fromarray(image_array))), repeat)
+        fused_time, fused_out = best_of(lambda: generator.enhance_array(image_array), repeat)
+
+        diff = np.abs(pil_out.astype(np.int16) - fused_out.astype(np.int16))
+        faces_same = np.mean(generator.quantize_image_array(pil_out) ==
+                             generator.quantize_image_array(fused_out))
+        if diff.mean() > tolerance:
+            failures += 1
+        print(f"{cubes:>6} {pil_time:8.4f} {fused_time:8.4f} {pil_time / fused_time:7.2f}x "
+              f"{diff.max():>9} {diff.mean():10.3f} {100 * faces_same:10.2f}%")
+        rows.append({'cubes': cubes, 'pil_s': pil_time, 'fused_s': fused_time,
+                     'max_diff': int(diff.max()), 'mean_diff': float(diff.mean()),
+                     'faces_same_pct': float(100 * faces_same), 'regression': bool(diff.mean() > tolerance)})
+    if failures:
+        print(f"REGRESSION: mean pixel difference above {tolerance} at {failures} size(s)")
+    return rows
+
+
+def bench_parallel(generator, sizes, worker_counts, repeat):
+    print("== Band-parallel quantization scaling ==")
+    print(f"{'cubes':>6} {'workers':>8} {'seconds':>9} {'speedup':>8} identical")
+    rows = []
+    for cubes in sizes:
+        image_array = synthetic_image_array(cubes)
+        serial = None
+        for workers in worker_counts:
+            elapsed, out = best_of(
+                lambda: generator.quantize_image_array(image_array, workers=workers), repeat)
+            if serial is None:
+                serial = (elapsed, out)
+            identical = 'yes' if np.array_equal(serial[1], out) else 'NO'
+            print(f"{cubes:>6} {workers:>8} {elapsed:9.3f} {serial[0] / elapsed:7.2f}x {identical}")
+            rows.append({'cubes': cubes, 'workers': workers, 'seconds': elapsed,
+                         'identical': identical == 'yes'})
+    return rows
+
+
+def legacy_mosaic_table(pdf_gen, grid, max_width=6*inch):
+    """The original Table-with-a-BACKGROUND-per-cell mosaic, as the baseline"""
+    grid_height = len(grid)
+    grid_width = len(grid[0])
+    cell_size = min(max_width / grid_width, 8)
+    table = Table([[''] * grid_width for _ in grid],
+                  colWidths=[cell_size] * grid_width, rowHeights=[cell_size] * grid_height)
+    table_style = [('GRID', (0, 0), (-1, -1), 0.5, colors.black)]
+    for row_idx, row in enumerate(grid):
+        for col_idx, cell_color in enumerate(row):
+            table_style.append(('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx),
+                                pdf_gen.hex_to_color(cell_color)))
+    table.setStyle(TableStyle(table_style))
+    return table
+
+
+def synthetic_mosaic(generator, cubes):
+    return MosaicResult(generator.quantize_image_array(synthetic_image_array(cubes)),
+                        generator.color_names, generator.palette_hex, cubes, cubes)
+
+
+def build_pdf(flowables):
+    buffer = io.BytesIO()
+    SimpleDocTemplate(buffer, pagesize=letter).build(flowables)
+    return buffer.getvalue()
+
+
+def bench_pdf_mosaic(generator, sizes, repeat):
+    print("== PDF mosaic page (Table per cell vs direct canvas flowable) ==")
+    print(f"{'cubes':>6} {'table s':>9} {'table KB':>9} {'canvas s':>9} {'canvas KB':>10} {'speedup':>8}")
+    pdf_gen = FixedPDFGenerator()
+    rows = []
+    for cubes in sizes:
+        mosaic = synthetic_mosaic(generator, cubes)
+        table_time, table_pdf = best_of(
+            lambda: build_pdf([legacy_mosaic_table(pdf_gen, mosaic.grid)]), 1)
+        canvas_time, canvas_pdf = best_of(
+            lambda: build_pdf([pdf_gen.create_mosaic_flowable(mosaic)]), repeat)
+        print(f"{cubes:>6} {table_time:9.3f} {len(table_pdf) / 1024:9.1f} "
+              f"{canvas_time:9.3f} {len(canvas_pdf) / 1024:10.1f} {table_time / canvas_time:7.1f}x")
+        rows.append({'cubes': cubes, 'table_s': table_time, 'table_bytes': len(table_pdf),
+                     'canvas_s': canvas_time, 'canvas_bytes': len(canvas_pdf)})
+    return rows
+
+
+def legacy_instruction_story(pdf_gen, mosaic, styles):
+    """The original one-Table-per-cube instruction pages, as the baseline"""
+    story = []
+    cube_count = 0
+    for row_idx, cube_row in enumerate(mosaic.detailed_grid):
+        for col_idx, cube_data in enumerate(cube_row):
+            cube_count += 1
+            if cube_count > 1 and (cube_count - 1) % 12 == 0:
+                story.append(PageBreak())
+            story.append(Paragraph(f"Cube {cube_count} (Row {row_idx + 1}, Col {col_idx + 1})",
+                                   styles['Heading3']))
+            faces = cube_data['faces']
+            face_table = Table([[pdf_gen.color_names[face['color']] for face in face_row] for face_row in faces],
+                               colWidths=[0.8*inch]*3, rowHeights=[0.3*inch]*3)
+            face_table.setStyle(TableStyle([
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('FONTSIZE', (0, 0), (-1, -1), 10)
+            ]))
+            for row_idx_face, face_row in enumerate(faces):
+                for col_idx_face, face in enumerate(face_row):
+                    face_table.setStyle(TableStyle([
+                        ('BACKGROUND', (col_idx_face, row_idx_face), (col_idx_face, row_idx_face),
+                         pdf_gen.hex_to_color(face['color']))
+                    ]))
+            story.append(face_table)
+            story.append(Spacer(1, 12))
+    return story
+
+
+def bench_pdf_instructions(generator, cube_counts, legacy_limit):
+    print("== PDF cube instructions (Table per cube vs page flowables) ==")
+    print(f"{'cubes':>6} {'legacy ms/cube':>15} {'page ms/cube':>13} {'pages':>6} {'KB':>8}")
+    pdf_gen = FixedPDFGenerator()
+    styles = getSampleStyleSheet()
+    rows = []
+    for cube_count in cube_counts:
+        side = int(round(cube_count ** 0.5))
+        mosaic = synthetic_mosaic(generator, side)
+        total = side * side
+
+        legacy_time = None
+        if total <= legacy_limit:
+            legacy_time, _ = best_of(
+                lambda: build_pdf(legacy_instruction_story(pdf_gen, mosaic, styles)), 1)
+            legacy_col = f"{1000 * legacy_time / total:15.3f}"
+        else:
+            legacy_col = f"{'skipped':>15}"
+
+        def build_pages():
+            story = []
+            pdf_gen.add_cube_instructions(story, mosaic, {}, styles)
+            pages = len(story) - 2  # heading and spacer
+            return build_pdf(story), pages
+
+        page_time, (pdf, pages) = best_of(build_pages, 1)
+        print(f"{total:>6} {legacy_col} {1000 * page_time / total:13.3f} "
+              f"{pages:>6} {len(pdf) / 1024:8.1f}")
+        rows.append({'cubes': total, 'legacy_s': legacy_time, 'page_s': page_time,
+                     'pages': pages, 'bytes': len(pdf)})
+    return rows
+
+
+def bench_serialization(generator, sizes, repeat, check_limit):
+    """Response encoding: nested lists + json vs direct from the index array"""
+    backend = 'orjson' if serialization.orjson is not None else 'json'
+    print(f"== Response serialization (stdlib json of nested lists vs direct, {backend} backend) ==")
+    print(f"{'cubes':>6} {'format':>8} {'json s':>9} {'direct s':>9} {'speedup':>8} {'raw KB':>10} "
+          f"{'gzip KB':>9} {'gzip s':>8} {'deflate KB':>11} {'same':>5}")
+    rows = []
+    for cubes in sizes:
+        indices = generator.quantize_image_array(synthetic_image_array(cubes))
+        for result_format in RESULT_FORMATS:
+            # A fresh result each run, so lazily built views are paid for
+            def fresh():
+                return MosaicResult(indices, generator.color_names, generator.palette_hex, cubes, cubes)
+
+            json_time, json_body = best_of(
+                lambda: json.dumps(fresh().encode(result_format), sort_keys=True).encode('utf-8'), repeat)
+            direct_time, body = best_of(
+                lambda: serialization.json_object(serialization.encode_mosaic(fresh(), result_format)), repeat)
+            gzip_time, gzip_body = best_of(lambda: serialization.compress(body, 'gzip'), repeat)
+            deflate_body = serialization.compress(body, 'deflate')
+
+            same = '-'
+            if cubes <= check_limit:
+                same = 'yes' if json.loads(body) == json.loads(json_body) else 'NO'
+            print(f"{cubes:>6} {result_format:>8} {json_time:9.4f} {direct_time:9.4f} "
+                  f"{json_time / direct_time:7.1f}x {len(body) / 1024:10.1f} {len(gzip_body) / 1024:9.1f} "
+                  f"{gzip_time:8.4f} {len(deflate_body) / 1024:11.1f} {same:>5}")
+            rows.append({'cubes': cubes, 'format': result_format, 'backend': backend,
+                         'json_s': json_time, 'direct_s': direct_time, 'json_bytes': len(json_body),
+                         'raw_bytes': len(body), 'gzip_bytes': len(gzip_body), 'gzip_s': gzip_time,
+                         'deflate_bytes': len(deflate_body),
+                         'same': None if same == '-' else same == 'yes'})
+    return rows
+
+
+def run_pipeline(generator, pdf_gen, jpeg, cubes, legacy_limit, pdf_limit):
+    """One end-to-end run from upload bytes to PDF, timed per stage"""
+    timer = StageTimer()
+    image = generator.decode_image(io.BytesIO(jpeg), cubes, cubes, timer=timer)
+    result = generator.generate_mosaic_result(image, cubes, cubes, timer=timer)
+
+    # Legacy nested grids and their JSON get very large, so they are capped
+    if cubes <= legacy_limit:
+        with timer.stage('grid'):
+            result.to_dict()
+        with timer.stage('json_legacy'):
+            json.dumps(result.encode('legacy'))
+    else:
+        timer.skip('grid', 'json_legacy')
+    with timer.stage('json_rle'):
+        json.dumps(result.encode('rle'))
+    with timer.stage('direct_legacy'):
+        serialization.json_object(serialization.encode_mosaic(result, 'legacy'))
+
+    if cubes <= pdf_limit:
+        pdf_gen.generate_pdf(result, {'width': cubes, 'height': cubes}, timer=timer)
+    else:
+        timer.skip('pdf_mosaic', 'pdf_instructions', 'pdf_build')
+    return timer.stages
+
+
+def bench_pipeline(generator, sizes, repeat, source_size, legacy_limit, pdf_limit):
+    """Per-stage timings of the whole pipeline, best of ``repeat`` per stage"""
+    width, height = source_size
+    print(f"== End-to-end pipeline from a {width}x{height} JPEG (ms, best per stage) ==")
+    jpeg = synthetic_photo_jpeg(width, height)
+    pdf_gen = FixedPDFGenerator()
+
+    rows = []
+    stage_names = None
+    for cubes in sizes:
+        best = {}
+        for _ in range(repeat):
+            for name, seconds in run_pipeline(generator, pdf_gen, jpeg, cubes,
+                                              legacy_limit, pdf_limit).items():
+                if seconds is None:
+                    best.setdefault(name, None)
+                else:
+                    best[name] = min(best.get(name) or float('inf'), seconds)
+
+        if stage_names is None:
+            stage_names = list(best)
+            print(f"{'cubes':>6} " + ' '.join(f"{name:>16}" for name in stage_names))
+        print(f"{cubes:>6} " + ' '.join(
+            f"{'skipped':>16}" if best.get(name) is None else f"{best[name] * 1000:16.2f}"
+            for name in stage_names))
+        rows.append({'cubes': cubes, 'source': f"{width}x{height}",
+                     'stages_ms': {name: None if seconds is None else round(seconds * 1000, 3)
+                                   for name, seconds in best.items()}})
+    return rows
+
+
+def bench_batch(images, sizes, worker_counts, source_size, pdf):
+    """Batch throughput: decode each image once, fan variants out over the pool"""
+    jpegs = [synthetic_photo_jpeg(*source_size, seed=seed) for seed in range(images)]
+    variants = [{'width': cubes, 'height': cubes, 'enhancement': None, 'palette': 'classic',
+                 'metric': 'lab_euclidean', 'dither': 'none'} for cubes in sizes]
+    decode_size = max(sizes), max(sizes)
+    items = images * len(variants)
+    pdf_settings = {} if pdf else None
+    print(f"== Batch throughput ({images} images x {len(variants)} variants, "
+          f"{source_size[0]}x{source_size[1]} uploads, pdf={'yes' if pdf else 'no'}) ==")
+    print(f"{'workers':>8} {'seconds':>9} {'items/s':>9} {'speedup':>8}")
+    rows = []
+    baseline = None
+    for workers in worker_counts:
+        queue = JobQueue(max_workers=workers)
+        try:
+            # Start every worker process before timing
+            wait([queue.execute(decode_job, jpegs[0], 16, 16) for _ in range(workers)])
+            start = time.perf_counter()
+            items_done = []
+            for future in [queue.execute(decode_job, jpeg, *decode_size) for jpeg in jpegs]:
+                array = future.result()
+                items_done += [queue.execute(batch_item_job, array, params, 'indices', pdf_settings)
+                               for params in variants]
+            for future in items_done:
+                future.result()
+            elapsed = time.perf_counter() - start
+        finally:
+            queue.shutdown()
+        if baseline is None:
+            baseline = elapsed
+        print(f"{workers:>8} {elapsed:9.3f} {items / elapsed:9.2f} {baseline / elapsed:7.2f}x")
+        rows.append({'workers': workers, 'images': images, 'variants': len(variants),
+                     'pdf': pdf, 'seconds': elapsed, 'items_per_second': items / elapsed})
+    return rows
+
+
+def legacy_cube_stats(result):
+    """The old per-cube max(set(...)) dominant colors and per-face color counts"""
+    dominant_grid = []
+    color_count = {}
+    for cube_row in result.cube_faces.reshape(result.height, result.width, 9).tolist():
+        simple_row = []
+        for cube in cube_row:
+            face_colors = [result.palette_hex[i] for i in cube]
+            simple_row.append(max(set(face_colors), key=face_colors.count))
+            for color in face_colors:
+                color_count[color] = color_count.get(color, 0) + 1
+        dominant_grid.append(simple_row)
+    return dominant_grid, color_count
+
+
+def bench_stats(generator, sizes, repeat, legacy_limit):
+    """Cube statistics: per-cube Python loops vs one bincount over the index array"""
+    print("== Cube statistics (legacy loops vs vectorized bincount) ==")
+    print(f"{'cubes':>6} {'legacy s':>9} {'numpy s':>9} {'speedup':>8} same")
+    rows = []
+    for cubes in sizes:
+        indices = generator.quantize_image_array(synthetic_image_array(cubes))
+
+        def fresh():
+            return MosaicResult(indices, generator.color_names, generator.palette_hex, cubes, cubes)
+
+        def vectorized():
+            result = fresh()
+            return result.stats, result.dominant_grid, result.color_count
+
+        numpy_time, (stats, dominant_grid, color_count) = best_of(vectorized, repeat)
+        if cubes > legacy_limit:
+            print(f"{cubes:>6} {'-':>9} {numpy_time:9.4f} {'-':>8} -")
+            rows.append({'cubes': cubes, 'legacy_s': None, 'numpy_s': numpy_time, 'same': None})
+            continue
+
+        legacy_time, (legacy_dominant, legacy_count) = best_of(lambda: legacy_cube_stats(fresh()), repeat)
+        # Ties may resolve to a different, equally frequent color
+        cube_counts = stats.cube_counts.reshape(-1, stats.cube_counts.shape[-1])
+        hex_index = {color: i for i, color in enumerate(generator.palette_hex)}
+        legacy_best = np.array([hex_index[color] for row in legacy_dominant for color in row])
+        positions = np.arange(len(cube_counts))
+        same = (color_count == legacy_count and
+                np.array_equal(cube_counts[positions, legacy_best], cube_counts.max(axis=1)))
+        print(f"{cubes:>6} {legacy_time:9.4f} {numpy_time:9.4f} {legacy_time / numpy_time:7.1f}x "
+              f"{'yes' if same else 'NO'}")
+        rows.append({'cubes': cubes, 'legacy_s': legacy_time, 'numpy_s': numpy_time, 'same': bool(same)})
+    return rows
+
+
+def bench_preview(generator, sizes, repeat, legacy_limit):
+    """Display payload: legacy grid JSON vs a server-rendered PNG preview / tile"""
+    print("== Preview rendering (legacy grid JSON vs PNG preview and tiles) ==")
+    print(f"{'cubes':>6} {'grid KB':>9} {'preview KB':>11} {'preview s':>10} "
+          f"{'tile KB':>8} {'tile s':>8}")
+    rows = []
+    for cubes in sizes:
+        indices = generator.quantize_image_array(synthetic_image_array(cubes))
+        result = MosaicResult(indices, generator.color_names, generator.palette_hex, cubes, cubes)
+        grid_bytes = None
+        if cubes <= legacy_limit:
+            grid_bytes = len(serialization.grid_json(result))
+        preview_time, png = best_of(lambda: preview.preview_png(result, grid=True), repeat)
+        # A deepest-zoom tile from the middle of the mosaic
+        layout = preview.tile_layout(result)['levels'][-1]
+        tile_time, tile = best_of(lambda: preview.tile_png(
+            result, layout['level'], layout['columns'] // 2, layout['rows'] // 2, grid=True), repeat)
+
+        grid_kb = f"{grid_bytes / 1024:9.1f}" if grid_bytes is not None else f"{'-':>9}"
+        print(f"{cubes:>6} {grid_kb} {len(png) / 1024:11.1f} {preview_time:10.4f} "
+              f"{len(tile) / 1024:8.1f} {tile_time:8.4f}")
+        rows.append({'cubes': cubes, 'grid_json_bytes': grid_bytes, 'preview_bytes': len(png),
+                     'preview_s': preview_time, 'tile_bytes': len(tile), 'tile_s': tile_time})
+    return rows
+
+
+def failed_checks(results):
+    """Suite rows whose built-in equivalence or regression check failed"""
+    return [
+        (name, row) for name, rows in results.items() for row in rows
+        if row.get('regression') or any(row.get(key) is False
+                                         for key in ('identical', 'same', 'reference_match'))
+    ]
+
+
+def environment_info():
+    """What the numbers were measured on, stored alongside JSON results"""
+    import PIL
+    import reportlab
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pillow': PIL.__version__,
+        'reportlab': reportlab.Version
+    }
+
+
+SUITES = ('quantize', 'lookup_table', 'palettes', 'enhance', 'dither', 'parallel',
+          'serialization', 'stats', 'preview', 'pdf_mosaic', 'pdf_instructions', 'pipeline', 'batch')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--suites', nargs='+', choices=SUITES, default=list(SUITES),
+                        help='benchmarks to run (default: all)')
+    parser.add_argument('--json', metavar='PATH',
+                        help='also write machine-readable results to this file')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[16, 64, 256],
+                        help='mosaic sizes in cubes per side')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='timed runs per measurement (best is reported)')
+    parser.add_argument('--legacy-limit', type=int, default=256,
+                        help='skip the slow per-pixel baseline above this size')
+    parser.add_argument('--lut-bits', type=int, default=8,
+                        help='lookup table resolution per channel')
+    parser.add_argument('--lut-dir', default=None,
+                        help='lookup table cache directory')
+    parser.add_argument('--enhance-tolerance', type=float, default=1.0,
+                        help='maximum mean per-channel difference of fused vs PIL enhancement')
+    parser.add_argument('--dither-sizes', type=int, nargs='+', default=[64, 256, 500],
+                        help='mosaic sizes for the dithering comparison')
+    parser.add_argument('--legacy-dither-limit', type=int, default=16,
+                        help='largest size checked against the per-pixel error diffusion loop')
+    parser.add_argument('--parallel-sizes', type=int, nargs='+', default=[500],
+                        help='mosaic sizes for the band-parallel scaling benchmark')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='worker counts for the band-parallel scaling benchmark')
+    parser.add_argument('--serialization-sizes', type=int, nargs='+', default=[16, 64, 256],
+                        help='mosaic sizes for the response serialization benchmark')
+    parser.add_argument('--serialization-check-limit', type=int, default=64,
+                        help='largest size whose direct JSON is parsed and compared')
+    parser.add_argument('--pdf-sizes', type=int, nargs='+', default=[16, 32, 64, 100],
+                        help='mosaic sizes for the PDF rendering benchmarks')
+    parser.add_argument('--instruction-cubes', type=int, nargs='+', default=[1000, 10000],
+                        help='approximate cube counts for the instruction page benchmark')
+    parser.add_argument('--legacy-instruction-limit', type=int, default=1100,
+                        help='skip the slow one-table-per-cube baseline above this many cubes')
+    parser.add_argument('--pipeline-sizes', type=int, nargs='+', default=[16, 32, 64, 128, 256, 512],
+                        help='mosaic sizes for the end-to-end pipeline benchmark')
+    parser.add_argument('--source-size', type=int, nargs=2, default=[4032, 3024], metavar=('W', 'H'),
+                        help='pixel size of the synthetic upload for the pipeline benchmark')
+    parser.add_argument('--pipeline-legacy-limit', type=int, default=256,
+                        help='skip legacy grid building and JSON above this size')
+    parser.add_argument('--pipeline-pdf-limit', type=int, default=128,
+                        help='skip the PDF stages above this size')
+    parser.add_argument('--batch-images', type=int, default=4,
+                        help='uploads per batch for the batch throughput benchmark')
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[16, 32, 64],
+                        help='variant mosaic sizes for the batch throughput benchmark')
+    parser.add_argument('--batch-workers', type=int, nargs='+', default=[1, 2, 4],
+                        help='process pool sizes for the batch throughput benchmark')
+    parser.add_argument('--batch-pdf', action='store_true',
+                        help='also render a guide for every batch item')
+    args = parser.parse_args()
+
+    generator = OptimizedMosaicGenerator()
+    suites = {
+        'quantize': lambda: bench_quantize(generator, args.sizes, args.repeat, args.legacy_limit),
+        'lookup_table': lambda: bench_lookup_table(args.sizes, args.repeat, args.lut_bits, args.lut_dir),
+        'palettes': lambda: bench_palettes(args.sizes, args.repeat),
+        'enhance': lambda: bench_enhance(generator, args.sizes, args.repeat, args.enhance_tolerance),
+        'dither': lambda: bench_dither(generator, args.dither_sizes, args.repeat, args.legacy_dither_limit),
+        'parallel': lambda: bench_parallel(generator, args.parallel_sizes, args.workers, args.repeat),
+        'serialization': lambda: bench_serialization(
+            generator, args.serialization_sizes, args.repeat, args.serialization_check_limit),
+        'stats': lambda: bench_stats(generator, args.sizes, args.repeat, args.legacy_limit),
+        'preview': lambda: bench_preview(generator, args.serialization_sizes, args.repeat, args.legacy_limit),
+        'pdf_mosaic': lambda: bench_pdf_mosaic(generator, args.pdf_sizes, args.repeat),
+        'pdf_instructions': lambda: bench_pdf_instructions(
+            generator, args.instruction_cubes, args.legacy_instruction_limit),
+        'pipeline': lambda: bench_pipeline(
+            generator, args.pipeline_sizes, args.repeat, args.source_size,
+            args.pipeline_legacy_limit, args.pipeline_pdf_limit),
+        'batch': lambda: bench_batch(
+            args.batch_images, args.batch_sizes, args.batch_workers, args.source_size, args.batch_pdf)
+    }
+
+    results = {}
+    for name in SUITES:
+        if name in args.suites:
+            results[name] = suites[name]()
+
+    if args.json:
+        report = {
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'environment': environment_info(),
+            'arguments': vars(args),
+            'results': results
+        }
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Wrote {args.json}")
+
+    failures = failed_checks(results)
+    for name, row in failures:
+        print(f"FAILED check in {name}: {row}")
+    # Non-zero exit so scripts can gate on the checks; tests/ covers them too
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
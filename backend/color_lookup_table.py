@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Bump when the table layout or build procedure changes
+LUT_FORMAT_VERSION = 1
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    'MOSAIC_LUT_CACHE_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+)
+
+
+class ColorLookupTable:
+    """Precomputed RGB -> palette index table
+
+    With a fixed palette the nearest-color mapping is a pure function of the
+    24-bit RGB value, so it can be tabulated once. ``bits`` controls the
+    resolution per channel: 8 bits is the exact 256^3 table (16 MB), 6 bits
+    is a 64^3 table (256 KB) matched at bucket centres.
+
+    Tables are saved as .npy files keyed on the palette and the distance
+    metric and are memory-mapped on load, so every worker process shares the
+    same pages from the OS cache.
+    """
+
+    def __init__(self, table, bits, path=None):
+        self.table = table
+        self.bits = bits
+        self.shift = 8 - bits
+        self.path = path
+        self.flat_table = table.reshape(-1)
+
+    @staticmethod
+    def cache_key(palette, metric, bits):
+        """Stable hash of everything the table contents depend on"""
+        payload = json.dumps({
+            'version': LUT_FORMAT_VERSION,
+            'palette': [[name, [int(c) for c in rgb]] for name, rgb in palette.items()],
+            'metric': metric,
+            'bits': bits,
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    @classmethod
+    def cache_path(cls, palette, metric, bits, cache_dir=None):
+        cache_dir = cache_dir or DEFAULT_CACHE_DIR
+        key = cls.cache_key(palette, metric, bits)
+        return os.path.join(cache_dir, f"palette_lut_{bits}bit_{key}.npy")
+
+    @classmethod
+    def build(cls, match_indices, bits):
+        """Tabulate ``match_indices`` over every quantized RGB value
+
+        ``match_indices`` maps an (..., 3) uint8 RGB array to palette indices.
+        The table is built one red plane at a time to keep memory bounded.
+        """
+        if not 1 <= bits <= 8:
+            raise ValueError(f"Lookup table bits must be between 1 and 8, got {bits}")
+
+        levels = 1 << bits
+        shift = 8 - bits
+        # Representative value of each bucket is its centre
+        values = (np.arange(levels) << shift) + ((1 << shift) >> 1)
+
+        plane = np.empty((levels, levels, 3), dtype=np.uint8)
+        plane[..., 1] = values[:, np.newaxis]
+        plane[..., 2] = values[np.newaxis, :]
+
+        table = np.empty((levels, levels, levels), dtype=np.uint8)
+        for r in range(levels):
+            plane[..., 0] = values[r]
+            table[r] = match_indices(plane)
+        return table
+
+    @classmethod
+    def load_or_build(cls, match_indices, palette, metric, bits=8, cache_dir=None):
+        """Memory-map the cached table, building and saving it on a miss"""
+        path = cls.cache_path(palette, metric, bits, cache_dir)
+        levels = 1 << bits
+
+        if os.path.exists(path):
+            try:
+                table = np.load(path, mmap_mode='r')
+                if table.shape == (levels, levels, levels) and table.dtype == np.uint8:
+                    return cls(table, bits, path)
+                logger.warning("Ignoring malformed lookup table %s", path)
+            except (OSError, ValueError) as e:
+                logger.warning("Failed to load lookup table %s: %s", path, e)
+
+        logger.info("Building %d^3 palette lookup table", levels)
+        table = cls.build(match_indices, bits)
+
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temp file and rename so concurrent workers never
+            # see a partially written table
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.npy.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, table)
+            os.replace(tmp_path, path)
+            table = np.load(path, mmap_mode='r')
+            logger.info("Saved lookup table to %s", path)
+        except OSError as e:
+            logger.warning("Could not persist lookup table (%s), keeping it in memory", e)
+            path = None
+
+        return cls(table, bits, path)
+
+    def lookup(self, image_array):
+        """Palette indices for an (..., 3) uint8 array with one gather"""
+        rgb = image_array.astype(np.intp)
+        if self.shift:
+            rgb >>= self.shift
+        packed = (rgb[..., 0] << (2 * self.bits)) | (rgb[..., 1] << self.bits) | rgb[..., 2]
+        return self.flat_table[packed]
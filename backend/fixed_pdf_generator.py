@@ -7,9 +7,18 @@ from reportlab.lib import colors
 from reportlab.graphics.shapes import Drawing, Rect
 from reportlab.graphics.renderPDF import drawToFile
 from reportlab.platypus.flowables import Flowable
+from reportlab.pdfbase.pdfmetrics import stringWidth
+from reportlab.lib.rl_accel import escapePDF, fp_str
 from PIL import Image as PILImage
+import numpy as np
 import io
+import logging
 import math
+from mosaic_result import MosaicResult
+from palettes import PALETTES, get_palette
+from instrumentation import timed_stage
+
+logger = logging.getLogger(__name__)
 
 class ColorRect(Flowable):
     """A simple colored rectangle flowable"""
@@ -22,25 +31,273 @@ class ColorRect(Flowable):
         self.canv.setFillColor(self.color)
         self.canv.rect(0, 0, self.width, self.height, fill=1)
 
+class MosaicFlowable(Flowable):
+    """Draws a palette-index array straight onto the canvas
+    
+    Horizontal runs of the same color are merged into a single rect, each
+    color is set once, and all grid lines go out as one path. This replaces
+    a Table with one BACKGROUND style command per cell.
+    
+    Cells are at most ``cell_size`` points and shrink to fit the frame,
+    down to ``min_cell_size``. Mosaics still too wide at that size are
+    split into bands of columns, and too tall ones into bands of rows,
+    across pages.
+    """
+    def __init__(self, indices, palette_colors, cell_size, grid_color=colors.black, grid_width=0.5,
+                 min_cell_size=2):
+        Flowable.__init__(self)
+        self.indices = np.asarray(indices)
+        self.palette_colors = palette_colors
+        self.max_cell_size = cell_size
+        self.min_cell_size = min(min_cell_size, cell_size)
+        self.grid_color = grid_color
+        self.grid_width = grid_width
+        self.rows, self.cols = self.indices.shape
+        self._size_cells(cell_size)
+        self.hAlign = 'CENTER'
+    
+    def _size_cells(self, cell_size):
+        self.cell_size = cell_size
+        self.width = self.cols * cell_size
+        self.height = self.rows * cell_size
+    
+    def wrap(self, availWidth, availHeight):
+        cell_size = min(self.max_cell_size, availWidth / self.cols, availHeight / self.rows)
+        self._size_cells(max(self.min_cell_size, cell_size))
+        return self.width, self.height
+    
+    def _band(self, indices):
+        # Bands keep this cell size, whatever page they land on
+        return MosaicFlowable(indices, self.palette_colors, self.cell_size,
+                              self.grid_color, self.grid_width, self.cell_size)
+    
+    def split(self, availWidth, availHeight):
+        self.wrap(availWidth, availHeight)
+        if self.width > availWidth:
+            # Left columns first; each band is split into rows as needed
+            cols_fit = int(availWidth // self.cell_size)
+            if cols_fit < 1:
+                return []
+            return [self._band(self.indices[:, :cols_fit]), self._band(self.indices[:, cols_fit:])]
+        
+        rows_fit = int(availHeight // self.cell_size)
+        if self.height <= availHeight or rows_fit < 1:
+            return []
+        return [self._band(self.indices[:rows_fit]), self._band(self.indices[rows_fit:])]
+    
+    def color_runs(self):
+        """Yield (palette index, row, start col, run length) per horizontal run"""
+        for row_idx, row in enumerate(self.indices):
+            starts = np.concatenate(([0], np.flatnonzero(np.diff(row)) + 1))
+            lengths = np.diff(np.append(starts, self.cols))
+            for start, length in zip(starts.tolist(), lengths.tolist()):
+                yield int(row[start]), row_idx, start, length
+    
+    def draw(self):
+        canv = self.canv
+        cell = self.cell_size
+        
+        # Group runs by color so each fill color is set only once
+        runs_by_color = {}
+        for color_index, row_idx, start, length in self.color_runs():
+            runs_by_color.setdefault(color_index, []).append((row_idx, start, length))
+        
+        for color_index, runs in runs_by_color.items():
+            canv.setFillColor(self.palette_colors[color_index])
+            path = canv.beginPath()
+            for row_idx, start, length in runs:
+                # Row 0 is at the top; the canvas origin is bottom-left
+                path.rect(start * cell, self.height - (row_idx + 1) * cell, length * cell, cell)
+            canv.drawPath(path, stroke=0, fill=1)
+        
+        # All grid lines as a single path
+        canv.setStrokeColor(self.grid_color)
+        canv.setLineWidth(self.grid_width)
+        path = canv.beginPath()
+        for row_idx in range(self.rows + 1):
+            y = row_idx * cell
+            path.moveTo(0, y)
+            path.lineTo(self.width, y)
+        for col_idx in range(self.cols + 1):
+            x = col_idx * cell
+            path.moveTo(x, 0)
+            path.lineTo(x, self.height)
+        canv.drawPath(path, stroke=1, fill=0)
+
+class CubeInstructionLayout:
+    """Geometry for a page of cube instructions laid out in a columns x rows grid
+    
+    Coordinates are computed once per available frame size and shared by
+    every page with that size.
+    """
+    title_font = 'Helvetica-Bold'
+    name_font = 'Helvetica'
+    
+    def __init__(self, columns=4, rows=3):
+        if not (1 <= columns <= 12 and 1 <= rows <= 12):
+            raise ValueError(f"Instruction layout must be between 1x1 and 12x12, got {columns}x{rows}")
+        self.columns = columns
+        self.rows = rows
+        self.cubes_per_page = columns * rows
+        self._geometry = {}
+    
+    @classmethod
+    def parse(cls, spec):
+        """Build a layout from a 'COLUMNSxROWS' string such as '4x3'"""
+        try:
+            columns, rows = (int(part) for part in str(spec).lower().split('x'))
+        except ValueError:
+            raise ValueError(f"Invalid instruction layout '{spec}', expected e.g. '4x3'")
+        return cls(columns, rows)
+    
+    def geometry(self, width, height, names):
+        """Slot origins, face size and font sizes for a width x height frame"""
+        key = (round(width, 2), round(height, 2))
+        if key not in self._geometry:
+            slot_width = width / self.columns
+            slot_height = height / self.rows
+            padding = min(slot_width, slot_height) * 0.08
+            title_size = min(10, slot_height * 0.08)
+            title_height = title_size * 1.6
+            face_size = min(
+                (slot_width - 2 * padding) / 3,
+                (slot_height - 2 * padding - title_height) / 3
+            )
+            
+            # Largest font at which every color name fits inside a face
+            widest_name = max(stringWidth(name, self.name_font, 1) for name in names)
+            name_size = min(10, face_size * 0.85 / widest_name, face_size * 0.4)
+            
+            # Top-left corner of each slot, in page-reading order
+            slots = [
+                (col * slot_width + padding, height - row * slot_height - padding)
+                for row in range(self.rows)
+                for col in range(self.columns)
+            ]
+            
+            # Bottom-left corner of each face relative to its slot's top-left
+            grid_left = (slot_width - 2 * padding - 3 * face_size) / 2
+            grid_top = -title_height
+            face_offsets = [
+                (grid_left + face_x * face_size, grid_top - (face_y + 1) * face_size)
+                for face_y in range(3)
+                for face_x in range(3)
+            ]
+            
+            # Pre-formatted PDF operators for every face of every slot:
+            # rect_ops[slot][face] and name_ops[slot][face][color index]
+            name_widths = [stringWidth(name, self.name_font, name_size) for name in names]
+            escaped_names = [escapePDF(name) for name in names]
+            name_baseline = (face_size - name_size * 0.7) / 2
+            rect_ops = []
+            name_ops = []
+            for slot_x, slot_y in slots:
+                slot_rects = []
+                slot_names = []
+                for face_x, face_y in face_offsets:
+                    x = slot_x + face_x
+                    y = slot_y + face_y
+                    slot_rects.append(f"{fp_str(x, y, face_size, face_size)} re")
+                    slot_names.append([
+                        f"1 0 0 1 {fp_str(x + (face_size - width) / 2, y + name_baseline)} Tm ({name}) Tj"
+                        for width, name in zip(name_widths, escaped_names)
+                    ])
+                rect_ops.append(slot_rects)
+                name_ops.append(slot_names)
+            
+            self._geometry[key] = {
+                'slots': slots,
+                'slot_width': slot_width - 2 * padding,
+                'title_size': title_size,
+                'name_size': name_size,
+                'rect_ops': rect_ops,
+                'name_ops': name_ops
+            }
+        return self._geometry[key]
+
+class CubeInstructionPage(Flowable):
+    """One full page of cube instructions drawn as a single flowable
+    
+    ``cube_faces`` is the (cubes, 9) palette-index array of the whole mosaic
+    in row-major cube order; each page draws cubes [first, first + count).
+    Face rects and labels come pre-formatted from the layout, so drawing a
+    cube is list appends; fills are emitted once per color.
+    """
+    def __init__(self, cube_faces, mosaic_width, first, count, layout, palette_colors, palette_names):
+        Flowable.__init__(self)
+        self.cube_faces = cube_faces
+        self.mosaic_width = mosaic_width
+        self.first = first
+        self.count = count
+        self.layout = layout
+        self.palette_colors = palette_colors
+        self.palette_names = palette_names
+    
+    def wrap(self, availWidth, availHeight):
+        # Fill whatever space the frame has left
+        self.width = availWidth
+        self.height = availHeight
+        return availWidth, availHeight
+    
+    def draw(self):
+        canv = self.canv
+        layout = self.layout
+        geometry = layout.geometry(self.width, self.height, self.palette_names)
+        rect_ops = geometry['rect_ops']
+        name_ops = geometry['name_ops']
+        
+        cubes = self.cube_faces[self.first:self.first + self.count].tolist()
+        fill_ops = {}
+        grid_ops = []
+        text_ops = []
+        titles = canv.beginText()
+        
+        for slot, faces in enumerate(cubes):
+            cube_number = self.first + slot
+            slot_x, slot_y = geometry['slots'][slot]
+            
+            title = (f"Cube {cube_number + 1} "
+                     f"(Row {cube_number // self.mosaic_width + 1}, Col {cube_number % self.mosaic_width + 1})")
+            title_size = min(geometry['title_size'],
+                             geometry['slot_width'] / stringWidth(title, layout.title_font, 1))
+            titles.setFont(layout.title_font, title_size)
+            titles.setTextOrigin(slot_x, slot_y - geometry['title_size'])
+            titles.textOut(title)
+            
+            slot_rects = rect_ops[slot]
+            slot_names = name_ops[slot]
+            for face, color_index in enumerate(faces):
+                fill_ops.setdefault(color_index, []).append(slot_rects[face])
+                text_ops.append(slot_names[face][color_index])
+            grid_ops.extend(slot_rects)
+        
+        # One fill per color, one stroke for every face border
+        for color_index, ops in fill_ops.items():
+            canv.setFillColor(self.palette_colors[color_index])
+            canv.addLiteral(' '.join(ops) + ' f')
+        
+        canv.setStrokeColor(colors.black)
+        canv.setLineWidth(1)
+        canv.addLiteral(' '.join(grid_ops) + ' S')
+        
+        canv.setFillColor(colors.black)
+        canv.drawText(titles)
+        # setFont leaves the name font in the graphics state for the literal text block
+        canv.setFont(layout.name_font, geometry['name_size'])
+        canv.addLiteral('BT ' + ' '.join(text_ops) + ' ET')
+
 class FixedPDFGenerator:
     def __init__(self):
-        self.color_names = {
-            '#FFFFFF': 'White',
-            '#FFD500': 'Yellow', 
-            '#FF5800': 'Orange',
-            '#C41E3A': 'Red',
-            '#009E60': 'Green',
-            '#0051BA': 'Blue'
-        }
-        
-        self.color_objects = {
-            '#FFFFFF': colors.white,
-            '#FFD500': colors.yellow,
-            '#FF5800': colors.orange,
-            '#C41E3A': colors.red,
-            '#009E60': colors.green,
-            '#0051BA': colors.blue
-        }
+        # Display name per hex color of every registered palette; the
+        # default palette wins where palettes share a color
+        self.default_palette = get_palette()
+        self.color_names = {}
+        # Fill colors are the palettes' exact RGB, as in the PNG previews
+        self.color_objects = {}
+        for palette in [self.default_palette, *PALETTES.values()]:
+            for hex_color, name, rgb in zip(palette.hex, palette.display_names, palette.rgb.tolist()):
+                self.color_names.setdefault(hex_color, name)
+                self.color_objects.setdefault(hex_color, Color(*(channel / 255.0 for channel in rgb)))
 
     def hex_to_color(self, hex_color):
         """Convert hex color to ReportLab Color object"""
@@ -56,56 +313,50 @@ class FixedPDFGenerator:
             return Color(r, g, b)
         return colors.white
 
-    def create_mosaic_flowable(self, mosaic_data, max_width=6*inch):
-        """Create a flowable mosaic using colored rectangles"""
-        print("Creating mosaic flowable...")
-        
-        # Get the expanded grid
-        grid = mosaic_data.get('grid', [])
-        if not grid:
+    def to_mosaic_result(self, mosaic_data):
+        """Accept a MosaicResult or any dict encoding of one; None if empty"""
+        if mosaic_data is None or isinstance(mosaic_data, MosaicResult):
+            return mosaic_data
+        if mosaic_data.get('format') in ('indices', 'rle'):
+            return MosaicResult.from_dict(mosaic_data)
+        if not mosaic_data.get('grid'):
+            return None
+        return MosaicResult.from_dict(
+            mosaic_data,
+            color_names=self.default_palette.display_names,
+            palette_hex=self.default_palette.hex
+        )
+
+    def create_mosaic_flowable(self, mosaic, max_width=6*inch):
+        """Create a flowable that draws the mosaic directly on the canvas"""
+        if mosaic is None:
             return Paragraph("No mosaic data available", getSampleStyleSheet()['Normal'])
         
-        grid_height = len(grid)
-        grid_width = len(grid[0]) if grid else 0
-        
-        print(f"Grid dimensions: {grid_width}x{grid_height}")
+        grid_height, grid_width = mosaic.indices.shape
+        logger.debug("Creating mosaic flowable for a %dx%d grid", grid_width, grid_height)
         
         # Calculate cell size to fit within max_width
         cell_size = min(max_width / grid_width, 8)  # Max 8 points per cell
         
-        # Create a table with colored cells
-        table_data = []
-        for row in grid:
-            table_row = []
-            for cell_color in row:
-                # Create a small colored paragraph
-                table_row.append('')
-            table_data.append(table_row)
-        
-        # Create table
-        table = Table(table_data, colWidths=[cell_size]*grid_width, rowHeights=[cell_size]*grid_height)
-        
-        # Apply colors to cells
-        table_style = [('GRID', (0, 0), (-1, -1), 0.5, colors.black)]
-        
-        for row_idx, row in enumerate(grid):
-            for col_idx, cell_color in enumerate(row):
-                color_obj = self.hex_to_color(cell_color)
-                table_style.append(('BACKGROUND', (col_idx, row_idx), (col_idx, row_idx), color_obj))
-        
-        table.setStyle(TableStyle(table_style))
-        
-        print("Mosaic flowable created successfully")
-        return table
+        palette_colors = [self.hex_to_color(hex_color) for hex_color in mosaic.palette_hex]
+        flowable = MosaicFlowable(mosaic.indices, palette_colors, cell_size)
+        return flowable
 
-    def generate_pdf(self, mosaic_data, settings):
-        """Generate PDF with mosaic image and cube instructions"""
+    def generate_pdf(self, mosaic_data, settings, output=None, timer=None):
+        """Generate PDF with mosaic image and cube instructions
+        
+        Writes into ``output`` (any binary file object, e.g. a temporary
+        file) or a new BytesIO, and returns it rewound. reportlab renders
+        the whole document to one bytes object and writes it in a single
+        call, so the complete PDF is in memory once during the build,
+        whatever ``output`` is. With a StageTimer, the mosaic page,
+        instruction pages and final build are timed as separate stages.
+        """
         try:
-            print("=== Starting FIXED PDF Generation ===")
-            print(f"Settings: {settings}")
+            logger.debug("Starting PDF generation with settings %s", settings)
             
             # Create PDF buffer
-            buffer = io.BytesIO()
+            buffer = output if output is not None else io.BytesIO()
             doc = SimpleDocTemplate(buffer, pagesize=letter)
             
             # Get styles
@@ -118,20 +369,22 @@ class FixedPDFGenerator:
                 alignment=1  # Center
             )
             
-            story = []
-            
-            # Title page
-            story.append(Paragraph("Your Rubik's Cube Mosaic", title_style))
-            story.append(Spacer(1, 20))
-            
-            # Add mosaic visualization
-            print("Adding mosaic visualization...")
-            mosaic_flowable = self.create_mosaic_flowable(mosaic_data)
-            story.append(mosaic_flowable)
-            story.append(Spacer(1, 20))
+            with timed_stage(timer, 'pdf_mosaic'):
+                mosaic = self.to_mosaic_result(mosaic_data)
+                
+                story = []
+                
+                # Title page
+                story.append(Paragraph("Your Rubik's Cube Mosaic", title_style))
+                story.append(Spacer(1, 20))
+                
+                # Add mosaic visualization
+                mosaic_flowable = self.create_mosaic_flowable(mosaic)
+                story.append(mosaic_flowable)
+                story.append(Spacer(1, 20))
             
             # Add dimensions info
-            dimensions = mosaic_data.get('dimensions', {})
+            dimensions = mosaic.dimensions if mosaic is not None else {}
             info_text = f"""
             <b>Mosaic Specifications:</b><br/>
             • Cube Grid: {settings.get('width', 16)}×{settings.get('height', 16)} cubes<br/>
@@ -142,78 +395,104 @@ class FixedPDFGenerator:
             story.append(Paragraph(info_text, styles['Normal']))
             story.append(PageBreak())
             
+            # Sticker totals, from the same statistics as the API's
+            with timed_stage(timer, 'pdf_materials'):
+                self.add_bill_of_materials(story, mosaic, styles)
+            
             # Add cube instructions
-            print("Adding cube instructions...")
-            self.add_cube_instructions(story, mosaic_data, settings, styles)
+            with timed_stage(timer, 'pdf_instructions'):
+                self.add_cube_instructions(story, mosaic, settings, styles)
             
-            print("Building final PDF...")
-            doc.build(story)
+            with timed_stage(timer, 'pdf_build'):
+                doc.build(story)
             
-            print("✅ PDF generated successfully!")
+            logger.debug("PDF generated")
             buffer.seek(0)
             return buffer
             
-        except Exception as e:
-            print(f"=== PDF Generation Error ===")
-            print(f"Error: {e}")
-            import traceback
-            traceback.print_exc()
-            raise e
+        except Exception:
+            logger.exception("PDF generation failed")
+            raise
+
+    def add_bill_of_materials(self, story, mosaic, styles):
+        """Add stickers needed per color, overall and per cube row and column"""
+        if mosaic is None:
+            return
+        
+        stats = mosaic.stats
+        used = np.flatnonzero(stats.color_counts)
+        names = [self.color_names.get(mosaic.palette_hex[i], mosaic.color_names[i]) for i in used]
+        swatches = [ColorRect(10, 10, self.hex_to_color(mosaic.palette_hex[i])) for i in used]
+        total_faces = int(stats.color_counts.sum())
+        
+        story.append(Paragraph("Bill of Materials", styles['Heading1']))
+        story.append(Spacer(1, 12))
+        
+        rows = [['', 'Color', 'Stickers', 'Share', 'Cubes mostly this color']]
+        for i, name, swatch in zip(used, names, swatches):
+            count = int(stats.color_counts[i])
+            rows.append([swatch, name, count, f"{count / total_faces:.1%}", int(stats.dominant_counts[i])])
+        rows.append(['', 'Total', total_faces, '', mosaic.width * mosaic.height])
+        table = Table(rows, hAlign='LEFT')
+        table.setStyle(TableStyle([
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+            ('LINEABOVE', (0, -1), (-1, -1), 0.5, colors.black),
+            ('ALIGN', (2, 0), (-1, -1), 'RIGHT'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE')
+        ]))
+        story.append(table)
+        
+        # One kit per row or column of cubes keeps assembly sorted
+        for title, label, counts in (("Stickers per Cube Row", 'Row', stats.row_counts),
+                                     ("Stickers per Cube Column", 'Column', stats.column_counts)):
+            story.append(Spacer(1, 18))
+            story.append(Paragraph(title, styles['Heading2']))
+            header = [label] + names
+            body = [[number + 1] + line for number, line in enumerate(counts[:, used].tolist())]
+            table = Table([header] + body, repeatRows=1, hAlign='LEFT')
+            table.setStyle(TableStyle([
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 8),
+                ('LINEBELOW', (0, 0), (-1, 0), 0.5, colors.black),
+                ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.whitesmoke])
+            ]))
+            story.append(table)
+        
+        story.append(PageBreak())
 
-    def add_cube_instructions(self, story, mosaic_data, settings, styles):
-        """Add detailed cube instructions to PDF"""
-        detailed_grid = mosaic_data.get('detailed_grid', [])
-        if not detailed_grid:
+    def add_cube_instructions(self, story, mosaic, settings, styles):
+        """Add detailed cube instructions to PDF, one flowable per page"""
+        if mosaic is None:
             story.append(Paragraph("No detailed cube data available", styles['Normal']))
             return
         
+        # Cubes per page, e.g. '4x3' (columns x rows) or '6x5'
+        layout = CubeInstructionLayout.parse(settings.get('instructionLayout', '4x3'))
+        
         story.append(Paragraph("Detailed Cube Instructions", styles['Heading1']))
         story.append(Spacer(1, 12))
         
-        cube_count = 0
-        cubes_per_page = 12  # 4x3 layout
+        # Color objects and display names are shared by every page
+        palette_colors = [self.hex_to_color(hex_color) for hex_color in mosaic.palette_hex]
+        palette_names = [
+            self.color_names.get(hex_color, name)
+            for hex_color, name in zip(mosaic.palette_hex, mosaic.color_names)
+        ]
+        cube_faces = mosaic.cube_faces.reshape(-1, 9)
+        cube_count = len(cube_faces)
         
-        for row_idx, cube_row in enumerate(detailed_grid):
-            for col_idx, cube_data in enumerate(cube_row):
-                cube_count += 1
-                
-                # Add page break every 12 cubes
-                if cube_count > 1 and (cube_count - 1) % cubes_per_page == 0:
-                    story.append(PageBreak())
-                
-                # Cube header
-                cube_title = f"Cube {cube_count} (Row {row_idx + 1}, Col {col_idx + 1})"
-                story.append(Paragraph(cube_title, styles['Heading3']))
-                
-                # Create 3x3 face table
-                faces = cube_data.get('faces', [])
-                if faces and len(faces) == 3:
-                    face_data = []
-                    for face_row in faces:
-                        if len(face_row) == 3:
-                            face_data.append([self.color_names.get(face['color'], face['name']) for face in face_row])
-                        else:
-                            face_data.append(['White', 'White', 'White'])
-                    
-                    # Create face table
-                    face_table = Table(face_data, colWidths=[0.8*inch]*3, rowHeights=[0.3*inch]*3)
-                    face_table.setStyle(TableStyle([
-                        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                        ('FONTSIZE', (0, 0), (-1, -1), 10)
-                    ]))
-                    
-                    # Add colors to table
-                    for row_idx_face, face_row in enumerate(faces):
-                        for col_idx_face, face in enumerate(face_row):
-                            color_obj = self.hex_to_color(face['color'])
-                            face_table.setStyle(TableStyle([
-                                ('BACKGROUND', (col_idx_face, row_idx_face), (col_idx_face, row_idx_face), color_obj)
-                            ]))
-                    
-                    story.append(face_table)
-                
-                story.append(Spacer(1, 12))
+        for first in range(0, cube_count, layout.cubes_per_page):
+            story.append(CubeInstructionPage(
+                cube_faces,
+                mosaic.width,
+                first,
+                min(layout.cubes_per_page, cube_count - first),
+                layout,
+                palette_colors,
+                palette_names
+            ))
         
-        print(f"Added instructions for {cube_count} cubes")
+        logger.debug("Added instructions for %d cubes", cube_count)
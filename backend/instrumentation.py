@@ -0,0 +1,141 @@
+import cProfile
+import pstats
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# Capture modes accepted by RequestProfiler
+PROFILE_MODES = ('cprofile', 'tracemalloc')
+
+
+class StageTimer:
+    """Wall-clock timing of named pipeline stages
+
+    Use ``with timer.stage('resize'):`` around each stage; repeated stages
+    accumulate. Stages that were not needed can be recorded with ``skip()``.
+    ``as_dict()`` reports milliseconds in the order the stages first ran or
+    were skipped, with None for skipped stages.
+    """
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = (self.stages.get(name) or 0.0) + time.perf_counter() - start
+
+    def skip(self, *names):
+        """Record stages that did not run, e.g. because of a cache hit"""
+        for name in names:
+            self.stages.setdefault(name, None)
+
+    def as_dict(self):
+        timings = {
+            name: None if seconds is None else round(seconds * 1000, 3)
+            for name, seconds in self.stages.items()
+        }
+        timings['total'] = round(sum(s for s in self.stages.values() if s is not None) * 1000, 3)
+        return timings
+
+    def server_timing(self):
+        """Stages as a Server-Timing header value, for browser dev tools"""
+        return ', '.join(
+            f"{name};dur={seconds * 1000:.3f}"
+            for name, seconds in self.stages.items() if seconds is not None
+        )
+
+
+@contextmanager
+def timed_stage(timer, name):
+    """``timer.stage(name)`` when a timer is given, otherwise a no-op"""
+    if timer is None:
+        yield
+    else:
+        with timer.stage(name):
+            yield
+
+
+class RequestProfiler:
+    """Optional cProfile and/or tracemalloc capture around one request
+
+    Use as a context manager; ``modes`` is any subset of PROFILE_MODES and
+    may be empty, in which case nothing is captured. ``report()`` returns a
+    JSON-serializable summary with the ``top`` most expensive functions and
+    allocation sites.
+
+    cProfile only sees the calling thread, and tracemalloc is process-wide,
+    so profiled requests are serialized with a lock.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self, modes, top=20):
+        unknown = set(modes) - set(PROFILE_MODES)
+        if unknown:
+            raise ValueError(f"Unknown profile mode '{sorted(unknown)[0]}', "
+                             f"expected one of {', '.join(PROFILE_MODES)}")
+        self.modes = tuple(modes)
+        self.top = top
+        self.profile = None
+        self.snapshot = None
+        self.traced_memory = None
+
+    def __enter__(self):
+        if not self.modes:
+            return self
+        self._lock.acquire()
+        if 'tracemalloc' in self.modes:
+            tracemalloc.start()
+        if 'cprofile' in self.modes:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        return self
+
+    def __exit__(self, *exc_info):
+        if not self.modes:
+            return False
+        try:
+            if self.profile is not None:
+                self.profile.disable()
+            if 'tracemalloc' in self.modes:
+                self.traced_memory = tracemalloc.get_traced_memory()
+                self.snapshot = tracemalloc.take_snapshot()
+                tracemalloc.stop()
+        finally:
+            self._lock.release()
+        return False
+
+    def report(self):
+        report = {}
+        if self.profile is not None:
+            stats = pstats.Stats(self.profile)
+            rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)
+            report['cprofile'] = [
+                {
+                    'function': f"{filename}:{line}({name})",
+                    'calls': calls,
+                    'total_ms': round(total * 1000, 3),
+                    'cumulative_ms': round(cumulative * 1000, 3)
+                }
+                for (filename, line, name), (_, calls, total, cumulative, _) in rows[:self.top]
+            ]
+        if self.snapshot is not None:
+            current, peak = self.traced_memory
+            report['tracemalloc'] = {
+                'current_bytes': current,
+                'peak_bytes': peak,
+                'top': [
+                    {
+                        'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                        'size_bytes': stat.size,
+                        'count': stat.count
+                    }
+                    for stat in self.snapshot.statistics('lineno')[:self.top]
+                ]
+            }
+        return report
@@ -0,0 +1,335 @@
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from PIL import Image
+
+import serialization
+from fixed_pdf_generator import FixedPDFGenerator
+from optimized_mosaic_generator import OptimizedMosaicGenerator
+from result_cache import pack_result, unpack_result
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is at capacity"""
+
+
+# Per-process generator singletons, created by the pool initializer
+_worker_mosaic_gen = None
+_worker_pdf_gen = None
+
+# Queue on which workers report (task ID, start time) when a task starts
+_worker_started = None
+
+
+def _init_worker(lut_bits, max_input_pixels, started_queue):
+    global _worker_mosaic_gen, _worker_pdf_gen, _worker_started
+    _worker_started = started_queue
+    # The lookup table is memory-mapped, so workers share its pages
+    _worker_mosaic_gen = OptimizedMosaicGenerator(
+        lookup_table_bits=lut_bits,
+        max_input_pixels=max_input_pixels
+    )
+    _worker_pdf_gen = FixedPDFGenerator()
+
+
+def _timed(task_id, func, *args):
+    """Run a job body, returning (started_at, finished_at, result)
+
+    The start is also reported to the parent as soon as it happens, so
+    queued and running jobs can be told apart.
+    """
+    started_at = time.time()
+    _worker_started.put((task_id, started_at))
+    result = func(*args)
+    return started_at, time.time(), result
+
+
+def mosaic_job(source, params, decode_size=None):
+    """Worker body for mosaic generation; returns a packed result
+
+    ``source`` is either the uploaded bytes, decoded for ``decode_size``
+    cubes per side (the mosaic size by default), or an already decoded RGB
+    working copy as an array. ``params`` are keyword arguments for
+    generate_mosaic_result.
+    """
+    if isinstance(source, bytes):
+        width, height = decode_size or (params['width'], params['height'])
+        image = _worker_mosaic_gen.decode_image(io.BytesIO(source), width, height)
+    else:
+        image = Image.fromarray(source)
+    return pack_result(_worker_mosaic_gen.generate_mosaic_result(image, **params))
+
+
+def decode_job(image_bytes, width, height):
+    """Worker body decoding an upload into an RGB working copy array"""
+    image = _worker_mosaic_gen.decode_image(io.BytesIO(image_bytes), width, height)
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    return np.asarray(image)
+
+
+def batch_item_job(source, params, result_format, pdf_settings=None):
+    """Worker body for one batch item: (packed result, JSON members, PDF bytes)
+
+    ``source`` is either a decoded RGB working copy as an array or, for a
+    cached result, a packed result. The JSON members are ready for
+    serialization.json_object; the PDF is None unless ``pdf_settings``
+    are given.
+    """
+    if isinstance(source, tuple):
+        result = unpack_result(*source)
+        packed = source
+    else:
+        result = _worker_mosaic_gen.generate_mosaic_result(Image.fromarray(source), **params)
+        packed = pack_result(result)
+    members = serialization.encode_mosaic(result, result_format)
+
+    pdf = None
+    if pdf_settings is not None:
+        output = io.BytesIO()
+        _worker_pdf_gen.generate_pdf(result, pdf_settings, output=output)
+        pdf = output.getvalue()
+    return packed, members, pdf
+
+
+def pdf_job(mosaic, settings, output_dir):
+    """Worker body for PDF generation; returns the path of the written PDF
+
+    ``mosaic`` is either a packed result or a client-supplied mosaic dict.
+    """
+    if isinstance(mosaic, tuple):
+        mosaic = unpack_result(*mosaic)
+    fd, path = tempfile.mkstemp(dir=output_dir, prefix='mosaic-guide-', suffix='.pdf')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            _worker_pdf_gen.generate_pdf(mosaic, settings, output=f)
+    except Exception:
+        os.remove(path)
+        raise
+    return path
+
+
+class Job:
+    def __init__(self, job_id, kind, meta):
+        self.job_id = job_id
+        self.kind = kind
+        self.future = None
+        self.meta = meta
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.result = None
+        self.error = None
+
+    @property
+    def state(self):
+        if self.finished_at is not None:
+            return 'failed' if self.error else 'done'
+        # Future.running() is also true while a job waits in the pool's
+        # call queue, so only a start reported by the worker counts
+        if self.started_at is not None:
+            return 'running'
+        return 'queued'
+
+    def to_dict(self):
+        data = {
+            'jobId': self.job_id,
+            'kind': self.kind,
+            'status': self.state,
+            'submitted_at': self.submitted_at
+        }
+        if self.started_at is not None:
+            data['wait_seconds'] = round(self.started_at - self.submitted_at, 4)
+        if self.finished_at is not None:
+            data['run_seconds'] = round(self.finished_at - self.started_at, 4)
+        if self.error:
+            data['error'] = self.error
+        return data
+
+
+class JobQueue:
+    """Bounded process-pool job queue for mosaic and PDF generation
+
+    CPU-heavy work runs in ``max_workers`` processes instead of Flask's
+    request threads. At most ``max_pending`` jobs, plus capacity reserved
+    for untracked tasks, may be unfinished at once; further submissions
+    raise QueueFullError so callers can answer 429.
+    Finished jobs are kept for ``result_ttl`` seconds.
+    """
+
+    def __init__(self, max_workers=None, max_pending=None, result_ttl=600,
+                 lut_bits=None, max_input_pixels=None, output_dir=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending or self.max_workers * 4
+        self.result_ttl = result_ttl
+        self.lut_bits = lut_bits
+        self.max_input_pixels = max_input_pixels
+        self.output_dir = output_dir or tempfile.gettempdir()
+
+        self._executor = None
+        self._started_queue = None
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+        self.completed = 0
+        self.failed = 0
+        self.tasks = 0
+        self.reserved = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.total_run = 0.0
+        self.max_wait = 0.0
+        self.max_run = 0.0
+
+    def _get_executor(self):
+        """Start the pool on first use rather than at import time"""
+        if self._executor is None:
+            context = multiprocessing.get_context('spawn')
+            self._started_queue = context.Queue()
+            threading.Thread(target=self._track_starts, args=(self._started_queue,),
+                             name='job-queue-starts', daemon=True).start()
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=context,
+                initializer=_init_worker,
+                initargs=(self.lut_bits, self.max_input_pixels, self._started_queue)
+            )
+        return self._executor
+
+    def _track_starts(self, started_queue):
+        """Record start times reported by workers, until shutdown()"""
+        while True:
+            report = started_queue.get()
+            if report is None:
+                break
+            task_id, started_at = report
+            with self._lock:
+                job = self._jobs.get(task_id)
+                if job is not None and job.started_at is None:
+                    job.started_at = started_at
+
+    def submit(self, kind, func, *args, on_success=None, **meta):
+        """Queue ``func(*args)`` in a worker and return the new job ID
+
+        ``on_success`` is called in this process with the job's result.
+        """
+        with self._lock:
+            self._prune()
+            self._check_capacity(1)
+
+            # Created first, so the submit time precedes any start time
+            job_id = uuid.uuid4().hex
+            job = Job(job_id, kind, meta)
+            self._jobs[job_id] = job
+            future = job.future = self._get_executor().submit(_timed, job_id, func, *args)
+
+        future.add_done_callback(lambda f: self._finish(job, f, on_success))
+        return job_id
+
+    def _check_capacity(self, count):
+        """Raise QueueFullError unless ``count`` more tasks fit (lock held)"""
+        unfinished = sum(1 for job in self._jobs.values() if job.finished_at is None)
+        if unfinished + self.reserved + count > self.max_pending:
+            self.rejected += 1
+            raise QueueFullError(f"Job queue is full ({unfinished} jobs pending, "
+                                 f"{self.reserved} slots reserved)")
+
+    def reserve(self, count):
+        """Claim capacity for ``count`` concurrent execute() tasks
+
+        Raises QueueFullError if it isn't free; give it back with release().
+        """
+        with self._lock:
+            self._prune()
+            self._check_capacity(count)
+            self.reserved += count
+
+    def release(self, count):
+        with self._lock:
+            self.reserved -= count
+
+    def execute(self, func, *args):
+        """Run ``func(*args)`` in a worker and return its Future
+
+        Unlike submit(), nothing is tracked as a job: batch requests wait on
+        the futures themselves. Callers reserve() capacity for as many
+        tasks as they keep in the pool at once.
+        """
+        with self._lock:
+            self.tasks += 1
+        return self._get_executor().submit(func, *args)
+
+    def _finish(self, job, future, on_success):
+        try:
+            job.started_at, finished_at, job.result = future.result()
+            if on_success is not None:
+                on_success(job.result)
+        except Exception as e:
+            job.error = str(e) or e.__class__.__name__
+            finished_at = time.time()
+            if job.started_at is None:
+                job.started_at = finished_at
+
+        with self._lock:
+            job.finished_at = finished_at
+            wait = job.started_at - job.submitted_at
+            run = job.finished_at - job.started_at
+            if job.error:
+                self.failed += 1
+            else:
+                self.completed += 1
+            self.total_wait += wait
+            self.total_run += run
+            self.max_wait = max(self.max_wait, wait)
+            self.max_run = max(self.max_run, run)
+
+    def _prune(self):
+        """Forget finished jobs past their TTL (lock held)"""
+        cutoff = time.time() - self.result_ttl
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished_at is not None and job.finished_at < cutoff]
+        for job_id in expired:
+            job = self._jobs.pop(job_id)
+            if job.kind == 'pdf' and job.result:
+                try:
+                    os.remove(job.result)
+                except FileNotFoundError:
+                    pass
+
+    def get(self, job_id):
+        with self._lock:
+            self._prune()
+            return self._jobs.get(job_id)
+
+    def metrics(self):
+        with self._lock:
+            jobs = list(self._jobs.values())
+            finished = self.completed + self.failed
+            return {
+                'workers': self.max_workers,
+                'max_pending': self.max_pending,
+                'queued': sum(1 for job in jobs if job.state == 'queued'),
+                'running': sum(1 for job in jobs if job.state == 'running'),
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'tasks': self.tasks,
+                'reserved': self.reserved,
+                'avg_wait_seconds': round(self.total_wait / finished, 4) if finished else 0.0,
+                'max_wait_seconds': round(self.max_wait, 4),
+                'avg_run_seconds': round(self.total_run / finished, 4) if finished else 0.0,
+                'max_run_seconds': round(self.max_run, 4)
+            }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._started_queue.put(None)
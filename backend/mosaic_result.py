@@ -0,0 +1,242 @@
+import base64
+from functools import cached_property
+
+import numpy as np
+
+# Response encodings understood by MosaicResult.encode / from_dict
+RESULT_FORMATS = ('legacy', 'indices', 'rle')
+
+
+class MosaicStats:
+    """Sticker statistics of a mosaic from a single bincount over its cubes
+
+    ``cube_counts`` is (height, width, colors): how many faces of each cube
+    have each palette color. Everything else is reduced from it:
+
+    - ``dominant``: (height, width) palette index used most in each cube,
+      the lowest index on ties
+    - ``color_counts``: faces per palette color
+    - ``row_counts`` / ``column_counts``: faces per color in each cube row
+      / column, e.g. to pack one sticker kit per row
+    """
+
+    def __init__(self, result):
+        colors = len(result.palette_hex)
+        cubes = result.cube_faces.reshape(result.height, result.width, 9)
+        # Offset every cube's faces into its own range of bins
+        bins = cubes + (np.arange(result.height * result.width) * colors).reshape(
+            result.height, result.width, 1)
+        counts = np.bincount(bins.ravel(), minlength=result.height * result.width * colors)
+        self.cube_counts = counts.reshape(result.height, result.width, colors).astype(np.uint8)
+
+        self.dominant = self.cube_counts.argmax(axis=2).astype(np.uint8)
+        self.row_counts = self.cube_counts.sum(axis=1, dtype=np.int64)
+        self.column_counts = self.cube_counts.sum(axis=0, dtype=np.int64)
+        self.color_counts = self.row_counts.sum(axis=0)
+        self.dominant_counts = np.bincount(self.dominant.ravel(), minlength=colors)
+
+    def to_dict(self, include_dominant=False):
+        data = {
+            'colorCounts': self.color_counts.tolist(),
+            'dominantCounts': self.dominant_counts.tolist(),
+            'rowCounts': self.row_counts.tolist(),
+            'columnCounts': self.column_counts.tolist()
+        }
+        if include_dominant:
+            data['dominant'] = self.dominant.tolist()
+        return data
+
+
+class MosaicResult:
+    """Array-backed mosaic: one uint8 palette index per cube face
+
+    ``indices`` has shape (height * 3, width * 3); each 3x3 block is one
+    cube. The legacy nested structures (``grid``, ``detailed_grid``,
+    ``colorCount``) are produced lazily, only when something asks for them.
+    """
+
+    def __init__(self, indices, color_names, palette_hex, width, height, pixel_resolution=None):
+        self.indices = np.asarray(indices, dtype=np.uint8)
+        self.color_names = list(color_names)
+        self.palette_hex = list(palette_hex)
+        self.width = width
+        self.height = height
+        self.pixel_resolution = pixel_resolution or f"{width * 3}x{height * 3}"
+
+        expected_shape = (height * 3, width * 3)
+        if self.indices.shape != expected_shape:
+            raise ValueError(f"Index array shape {self.indices.shape} does not match "
+                             f"{width}x{height} cubes (expected {expected_shape})")
+
+    @property
+    def dimensions(self):
+        return {
+            'width': self.width,
+            'height': self.height,
+            'display_width': self.width * 3,  # Actual display width (3x3 per cube)
+            'display_height': self.height * 3,  # Actual display height (3x3 per cube)
+            'total': self.width * self.height,
+            'total_faces': self.width * self.height * 9,
+            'pixel_resolution': self.pixel_resolution
+        }
+
+    @property
+    def palette(self):
+        return [
+            {'index': i, 'color': color, 'name': name}
+            for i, (color, name) in enumerate(zip(self.palette_hex, self.color_names))
+        ]
+
+    @cached_property
+    def cube_faces(self):
+        """Index array viewed as (height, width, 3, 3) face blocks"""
+        return self.indices.reshape(self.height, 3, self.width, 3).swapaxes(1, 2)
+
+    @cached_property
+    def grid(self):
+        """Expanded (3H x 3W) grid of hex colors for website display"""
+        hex_lookup = np.array(self.palette_hex, dtype=object)
+        return hex_lookup[self.indices].tolist()
+
+    @cached_property
+    def detailed_grid(self):
+        """Per-cube 3x3 face dicts, as consumed by the PDF generator"""
+        detailed_grid = []
+        for cube_y, cube_row in enumerate(self.cube_faces.tolist()):
+            detailed_row = []
+            for cube_x, cube in enumerate(cube_row):
+                faces = [
+                    [{'color': self.palette_hex[i], 'name': self.color_names[i]} for i in face_row]
+                    for face_row in cube
+                ]
+                detailed_row.append({
+                    'faces': faces,
+                    'position': {'x': cube_x, 'y': cube_y}
+                })
+            detailed_grid.append(detailed_row)
+        return detailed_grid
+
+    @cached_property
+    def stats(self):
+        """Per-cube, per-row/column and total sticker counts"""
+        return MosaicStats(self)
+
+    @cached_property
+    def dominant_grid(self):
+        """Most frequent face color of each cube"""
+        hex_lookup = np.array(self.palette_hex, dtype=object)
+        return hex_lookup[self.stats.dominant].tolist()
+
+    @cached_property
+    def color_count(self):
+        """Face count per hex color, for colors that are used"""
+        return {
+            self.palette_hex[i]: int(count)
+            for i, count in enumerate(self.stats.color_counts) if count
+        }
+
+    def to_dict(self):
+        """Legacy response shape returned by generate_mosaic"""
+        return {
+            'grid': self.grid,  # 3x expanded for website
+            'detailed_grid': self.detailed_grid,
+            'colorCount': self.color_count,
+            'dimensions': self.dimensions
+        }
+
+    def run_lengths(self):
+        """Row-major run-length encoding as (values, lengths) arrays"""
+        flat = self.indices.ravel()
+        starts = np.concatenate(([0], np.flatnonzero(np.diff(flat)) + 1))
+        lengths = np.diff(np.append(starts, flat.size))
+        return flat[starts], lengths
+
+    def encode(self, result_format='legacy'):
+        """Serializable dict in the requested response format
+
+        'legacy'  - nested grid/detailed_grid of hex strings
+        'indices' - base64 of the raw uint8 index array plus the palette
+        'rle'     - flat [index, run, index, run, ...] list over row-major faces
+        """
+        if result_format == 'legacy':
+            return self.to_dict()
+
+        data = {
+            'format': result_format,
+            'palette': self.palette,
+            'shape': list(self.indices.shape),
+            'colorCount': self.color_count,
+            'dimensions': self.dimensions
+        }
+        if result_format == 'indices':
+            data['indices'] = base64.b64encode(self.indices.tobytes()).decode('ascii')
+        elif result_format == 'rle':
+            values, lengths = self.run_lengths()
+            data['runs'] = np.column_stack((values, lengths)).ravel().tolist()
+        else:
+            raise ValueError(f"Unknown result format '{result_format}', "
+                             f"expected one of {', '.join(RESULT_FORMATS)}")
+        return data
+
+    @classmethod
+    def from_dict(cls, data, color_names=None, palette_hex=None):
+        """Rebuild a result from any encoding produced by encode()
+
+        Legacy dicts carry no palette, so their hex colors are mapped onto
+        ``palette_hex``/``color_names`` when given; unknown colors are
+        appended to the palette.
+        """
+        dimensions = data.get('dimensions', {})
+        result_format = data.get('format', 'legacy')
+
+        if result_format in ('indices', 'rle'):
+            palette = sorted(data['palette'], key=lambda entry: entry['index'])
+            rows, cols = data['shape']
+            if result_format == 'indices':
+                flat = np.frombuffer(base64.b64decode(data['indices']), dtype=np.uint8)
+            else:
+                runs = np.asarray(data['runs'], dtype=np.int64).reshape(-1, 2)
+                flat = np.repeat(runs[:, 0], runs[:, 1]).astype(np.uint8)
+            return cls(
+                flat.reshape(rows, cols),
+                [entry['name'] for entry in palette],
+                [entry['color'] for entry in palette],
+                dimensions.get('width', cols // 3),
+                dimensions.get('height', rows // 3),
+                dimensions.get('pixel_resolution')
+            )
+
+        grid = data.get('grid') or []
+        if not grid:
+            raise ValueError("Mosaic data has no grid")
+
+        palette_hex = list(palette_hex or [])
+        color_names = list(color_names or palette_hex)
+        unique_colors, inverse = np.unique(np.array(grid, dtype=str), return_inverse=True)
+
+        # Names from the detailed grid win for colors outside the palette
+        detailed_names = {}
+        for cube_row in data.get('detailed_grid') or []:
+            for cube in cube_row:
+                for face_row in cube.get('faces', []):
+                    for face in face_row:
+                        detailed_names.setdefault(face['color'], face.get('name', face['color']))
+
+        position = {}
+        for color in unique_colors.tolist():
+            if color not in palette_hex:
+                palette_hex.append(color)
+                color_names.append(detailed_names.get(color, color))
+            position[color] = palette_hex.index(color)
+
+        remap = np.array([position[color] for color in unique_colors.tolist()], dtype=np.uint8)
+        rows = len(grid)
+        cols = len(grid[0])
+        return cls(
+            remap[inverse].reshape(rows, cols),
+            color_names,
+            palette_hex,
+            dimensions.get('width', cols // 3),
+            dimensions.get('height', rows // 3),
+            dimensions.get('pixel_resolution')
+        )
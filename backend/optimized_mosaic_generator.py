@@ -2,26 +2,143 @@ import numpy as np
 from PIL import Image, ImageEnhance, ImageFilter
 from sklearn.cluster import KMeans
 import colorsys
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+try:
+    import cv2
+except ImportError:  # fall back to the NumPy blur
+    cv2 = None
+from color_lookup_table import ColorLookupTable
+from color_metrics import DEFAULT_METRIC, METRICS
+from dithering import DITHER_MODES, ERROR_DIFFUSION_KERNELS, error_diffusion, ordered_dither
+from palettes import PALETTES, PaletteTables, get_palette
+from mosaic_result import MosaicResult
+from instrumentation import timed_stage
+
+logger = logging.getLogger(__name__)
+
+class ImageTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured input pixel limit"""
 
 class OptimizedMosaicGenerator:
-    def __init__(self):
-        # Rubik's cube colors (standard colors)
-        self.rubik_colors = {
-            'white': (255, 255, 255),
-            'yellow': (255, 213, 0),
-            'orange': (255, 88, 0),
-            'red': (196, 30, 58),
-            'green': (0, 158, 96),
-            'blue': (0, 81, 186)
-        }
+    # Quantization works on horizontal bands of about this many pixels,
+    # which bounds the temporary LAB/distance arrays and feeds the workers
+    BAND_PIXELS = 1 << 18
+    
+    # Defaults match the chained PIL passes in enhance_image_lightweight
+    DEFAULT_ENHANCEMENT = {
+        'contrast': 1.2,
+        'saturation': 1.3,
+        'sharpen': 110,           # UnsharpMask percent
+        'sharpen_radius': 1,
+        'sharpen_threshold': 1
+    }
+    
+    # Same integer luma weights as PIL's RGB -> L conversion
+    LUMA_WEIGHTS = np.array([19595, 38470, 7471], dtype=np.float32) / 65536
+    
+    # Ordered dithering: Bayer matrix size and the offset range in levels
+    BAYER_SIZE = 8
+    BAYER_SPREAD = 64
+    
+    # Decoding stops reducing once the image is within this factor of the
+    # target size, leaving LANCZOS enough detail for the final resample
+    PRE_REDUCE_FACTOR = 2
+    
+    def __init__(self, lookup_table_bits=None, lookup_table_dir=None, quantize_workers=1,
+                 max_input_pixels=64_000_000, palette=None, metric=None):
+        # Gamma-corrected value for every possible 8-bit channel value
+        self.gamma_lut = self.gamma_correct_batch(np.arange(256) / 255.0)
+        
+        # Blur kernels for the fused sharpen step, keyed by radius
+        self._blur_kernels = {}
+        
+        # Uploads larger than this are rejected before decoding
+        self.max_input_pixels = max_input_pixels
+        
+        # Threads used to quantize bands in parallel (NumPy releases the GIL)
+        self.quantize_workers = max(1, quantize_workers or 1)
+        
+        # Optional precomputed RGB -> palette index tables, one per palette
+        self.lookup_table_bits = lookup_table_bits
+        self.lookup_table_dir = lookup_table_dir
+        
+        # Future of the PaletteTables per (palette, metric), built on first use
+        self._palette_tables = {}
+        self._palette_lock = threading.Lock()
+        
+        # Default palette and metric when a request doesn't pick one
+        self.palette = get_palette(palette)
+        self.distance_metric = metric or DEFAULT_METRIC
+        tables = self.palette_tables()
+        
+        # Rubik's cube colors of the default palette
+        self.rubik_colors = dict(self.palette.colors)
         
         # Convert to numpy array for faster computation
         self.color_array = np.array(list(self.rubik_colors.values()))
         
-        # Precompute LAB colors for faster matching
-        self.lab_colors = {}
-        for name, rgb in self.rubik_colors.items():
-            self.lab_colors[name] = self.rgb_to_lab_fast(np.array(rgb))
+        # Palette tables of the default palette (index order == dict order)
+        self.color_names = self.palette.color_names
+        self.palette_lab = tables.palette_lab
+        self.palette_hex = self.palette.hex
+        self.lookup_table = tables.lookup_table
+    
+    def palette_tables(self, palette=None, metric=None):
+        """Cached PaletteTables for a palette and metric
+        
+        ``palette`` is a registered name or Palette; None picks the
+        generator's defaults. The palette's LAB values, and its lookup table
+        when lookup tables are enabled, are computed on first use only.
+        
+        Building a lookup table can take a while, so it happens outside the
+        shared lock: only callers that need the same tables wait for it.
+        """
+        palette = get_palette(palette or self.palette)
+        metric = metric or self.distance_metric
+        
+        key = (palette.name, palette.fingerprint, metric)
+        with self._palette_lock:
+            future = self._palette_tables.get(key)
+            building = future is None
+            if building:
+                future = self._palette_tables[key] = Future()
+        
+        if building:
+            try:
+                future.set_result(self._build_palette_tables(palette, metric))
+            except BaseException as e:
+                # Let the next caller try again
+                with self._palette_lock:
+                    del self._palette_tables[key]
+                future.set_exception(e)
+        return future.result()
+    
+    def _build_palette_tables(self, palette, metric):
+        palette_lab = np.array([
+            self.rgb_to_lab_fast(np.array(rgb)) for rgb in palette.colors.values()
+        ])
+        tables = PaletteTables(palette, metric, palette_lab)
+        if self.lookup_table_bits:
+            tables.lookup_table = ColorLookupTable.load_or_build(
+                lambda rgb: self.nearest_palette_indices(rgb, tables),
+                palette.colors,
+                metric,
+                bits=self.lookup_table_bits,
+                cache_dir=self.lookup_table_dir
+            )
+        return tables
+    
+    def prebuild_palette_tables(self, palettes=None, metrics=None):
+        """Build the tables of every registered palette and metric up front
+        
+        With lookup tables enabled this moves the table builds (or loads)
+        out of the first requests that pick each palette and metric.
+        """
+        for palette in palettes or list(PALETTES.values()):
+            for metric in metrics or list(METRICS):
+                self.palette_tables(palette, metric)
     
     def enhance_image_lightweight(self, image):
         """Lightweight but effective image enhancement"""
@@ -41,6 +158,96 @@ class OptimizedMosaicGenerator:
         
         return image
     
+    def blur_kernel(self, radius, passes=3):
+        """1-D kernel equivalent to PIL's GaussianBlur(radius)
+        
+        PIL approximates a Gaussian with ``passes`` extended box blurs; the
+        composition of those boxes is computed once per radius.
+        """
+        if radius not in self._blur_kernels:
+            sigma2 = radius * radius / passes
+            l = np.floor((np.sqrt(12 * sigma2 + 1) - 1) / 2)
+            a = (2 * l + 1) * (l * (l + 1) - 3 * sigma2) / (6 * (sigma2 - (l + 1) ** 2))
+            box = np.ones(int(l) * 2 + 3)
+            box[0] = box[-1] = a
+            box /= 2 * (l + a) + 1
+            
+            kernel = box
+            for _ in range(passes - 1):
+                kernel = np.convolve(kernel, box)
+            self._blur_kernels[radius] = kernel.astype(np.float32)
+        return self._blur_kernels[radius]
+    
+    def blur_array(self, image_array, radius):
+        """Separable blur of an (H, W, 3) float32 array with edge clamping"""
+        kernel = self.blur_kernel(radius)
+        if cv2 is not None:
+            return cv2.sepFilter2D(image_array, -1, kernel, kernel, borderType=cv2.BORDER_REPLICATE)
+        
+        pad = len(kernel) // 2
+        height, width = image_array.shape[:2]
+        padded = np.pad(image_array, ((pad, pad), (pad, pad), (0, 0)), mode='edge')
+        
+        rows = kernel[0] * padded[:, :width]
+        for i in range(1, len(kernel)):
+            rows += kernel[i] * padded[:, i:i + width]
+        
+        blurred = kernel[0] * rows[:height]
+        for i in range(1, len(kernel)):
+            blurred += kernel[i] * rows[i:i + height]
+        return blurred
+    
+    def luma(self, x):
+        """PIL-style gray level of an (H, W, 3) float32 array, rounded"""
+        weights = self.LUMA_WEIGHTS
+        gray = x[..., 0] * weights[0]
+        gray += x[..., 1] * weights[1]
+        gray += x[..., 2] * weights[2]
+        gray += 0.5
+        return np.floor(gray, out=gray)
+    
+    def enhance_array(self, image_array, contrast=1.2, saturation=1.3, sharpen=110,
+                      sharpen_radius=1, sharpen_threshold=1):
+        """Fused contrast, saturation and unsharp mask on an (H, W, 3) array
+        
+        Equivalent to enhance_image_lightweight (within a few levels) but
+        done in place on one float32 array with no intermediate PIL images.
+        Integer truncation of the PIL blends is kept so results stay close.
+        Returns uint8, ready for quantize_image_array.
+        """
+        x = np.array(image_array, dtype=np.float32)
+        
+        # Contrast: blend towards the mean gray level of the image
+        if contrast != 1:
+            mean = np.float32(np.floor(self.luma(x).mean() + 0.5))
+            x -= mean
+            x *= contrast
+            x += mean
+            np.clip(x, 0, 255, out=x)
+            np.floor(x, out=x)
+        
+        # Saturation: blend towards each pixel's own gray level
+        if saturation != 1:
+            gray = self.luma(x)[..., np.newaxis]
+            x -= gray
+            x *= saturation
+            x += gray
+            np.clip(x, 0, 255, out=x)
+            np.floor(x, out=x)
+        
+        # Unsharp mask: push pixels away from their blurred neighbourhood
+        if sharpen:
+            diff = self.blur_array(x, sharpen_radius)
+            np.rint(diff, out=diff)
+            np.subtract(x, diff, out=diff)
+            adjust = diff * np.float32(sharpen / 100)
+            np.trunc(adjust, out=adjust)
+            adjust[np.abs(diff) < sharpen_threshold] = 0
+            x += adjust
+            np.clip(x, 0, 255, out=x)
+        
+        return x.astype(np.uint8)
+    
     def rgb_to_lab_fast(self, rgb):
         """Fast RGB to LAB conversion with error handling"""
         try:
@@ -85,179 +292,238 @@ class OptimizedMosaicGenerator:
             # Fallback to simple RGB if LAB fails
             return rgb_norm * 100
     
-    def find_closest_rubik_color_fast(self, pixel_rgb):
-        """Fast color matching with error handling"""
-        try:
-            # Ensure valid RGB values
-            pixel_rgb = np.clip(pixel_rgb, 0, 255).astype(int)
-            
-            # Convert to LAB for perceptual matching
-            pixel_lab = self.rgb_to_lab_fast(pixel_rgb)
-            
-            min_distance = float('inf')
-            closest_color = 'white'
-            
-            for name, lab_color in self.lab_colors.items():
-                # Calculate Euclidean distance in LAB space
-                distance = np.sqrt(np.sum((pixel_lab - lab_color) ** 2))
-                
-                if distance < min_distance:
-                    min_distance = distance
-                    closest_color = name
-            
-            return self.rubik_colors[closest_color], closest_color
-            
-        except Exception as e:
-            print(f"Color matching error: {e}, falling back to white")
-            return self.rubik_colors['white'], 'white'
+    def gamma_correct_batch(self, c):
+        """sRGB gamma expansion for an array of normalized channel values"""
+        c = np.clip(c, 0, 1)
+        return np.where(c > 0.04045,
+                       np.power((c + 0.055) / 1.055, 2.4),
+                       c / 12.92)
+    
+    def rgb_to_lab_batch(self, rgb_array):
+        """Vectorized RGB to LAB conversion for an (..., 3) array
+        
+        Performs exactly the same arithmetic as rgb_to_lab_fast, so results
+        are bit-identical to the per-pixel path.
+        """
+        rgb_array = np.asarray(rgb_array)
+        if rgb_array.dtype == np.uint8:
+            rgb_linear = self.gamma_lut[rgb_array]
+        else:
+            rgb_linear = self.gamma_correct_batch(np.clip(rgb_array / 255.0, 0, 1))
+        
+        xyz = np.dot(rgb_linear, np.array([
+            [0.4124564, 0.3575761, 0.1804375],
+            [0.2126729, 0.7151522, 0.0721750],
+            [0.0193339, 0.1191920, 0.9503041]
+        ]))
+        
+        xyz_norm = np.clip(xyz / np.array([0.95047, 1.00000, 1.08883]), 0, 100)
+        fxyz = np.where(xyz_norm > 0.008856,
+                        np.power(xyz_norm, 1/3),
+                        (903.3 * xyz_norm + 16) / 116)
+        
+        lab = np.empty(fxyz.shape)
+        lab[..., 0] = np.clip(116 * fxyz[..., 1] - 16, 0, 100)
+        lab[..., 1] = np.clip(500 * (fxyz[..., 0] - fxyz[..., 1]), -128, 127)
+        lab[..., 2] = np.clip(200 * (fxyz[..., 1] - fxyz[..., 2]), -128, 127)
+        return lab
+    
+    def quantize_image_array(self, image_array, workers=None, tables=None):
+        """Map every pixel of an (H, W, 3) RGB array to a palette index
+        
+        Returns a uint8 array of shape (H, W) indexing into the colors of
+        ``tables`` (the default palette if None). Uses the precomputed
+        lookup table when one is loaded.
+        
+        The image is processed in horizontal bands aligned to cube rows
+        (multiples of 3 pixel rows). With ``workers`` > 1 the bands are
+        quantized concurrently in threads; each pixel is matched
+        independently, so the output is identical to the serial path.
+        """
+        image_array = np.asarray(image_array)
+        workers = self.quantize_workers if workers is None else max(1, workers)
+        tables = tables or self.palette_tables()
+        
+        height, width = image_array.shape[:2]
+        band_rows = max(3, (self.BAND_PIXELS // max(width, 1)) // 3 * 3)
+        if height <= band_rows:
+            return self.quantize_band(image_array, tables)
+        
+        output = np.empty((height, width), dtype=np.uint8)
+        
+        def run_band(start):
+            stop = min(start + band_rows, height)
+            output[start:stop] = self.quantize_band(image_array[start:stop], tables)
+        
+        band_starts = range(0, height, band_rows)
+        if workers == 1:
+            for start in band_starts:
+                run_band(start)
+        else:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                # list() re-raises any exception from a band
+                list(executor.map(run_band, band_starts))
+        return output
+    
+    def quantize_band(self, image_array, tables):
+        """Palette indices for one band, via the lookup table if loaded"""
+        if tables.lookup_table is not None and image_array.dtype == np.uint8:
+            return tables.lookup_table.lookup(image_array)
+        return self.nearest_palette_indices(image_array, tables)
+    
+    def dither_image_array(self, image_array, dither, tables=None):
+        """Palette indices of an (H, W, 3) uint8 array with dithering
+        
+        ``dither`` is one of DITHER_MODES: 'none' is plain nearest-color
+        quantization, 'bayer' is ordered dithering and the others are error
+        diffusion kernels.
+        """
+        tables = tables or self.palette_tables()
+        if dither in (None, 'none'):
+            return self.quantize_image_array(image_array, tables=tables)
+        if dither == 'bayer':
+            return ordered_dither(
+                image_array,
+                lambda dithered: self.quantize_image_array(dithered, tables=tables),
+                size=self.BAYER_SIZE,
+                spread=self.BAYER_SPREAD
+            )
+        if dither in ERROR_DIFFUSION_KERNELS:
+            return error_diffusion(
+                image_array,
+                lambda pixels: self.quantize_band(pixels, tables),
+                tables.palette.rgb,
+                kernel=dither
+            )
+        raise ValueError(f"Unknown dither mode '{dither}', expected one of {', '.join(DITHER_MODES)}")
+    
+    def nearest_palette_indices(self, image_array, tables=None):
+        """Vectorized nearest-color matching for an (..., 3) RGB array
+        
+        Converts the whole array to LAB in one pass and picks the nearest
+        palette color with a single broadcast distance/argmin, using the
+        palette and metric of ``tables`` (the defaults if None).
+        """
+        tables = tables or self.palette_tables()
+        image_array = np.asarray(image_array)
+        if image_array.dtype != np.uint8:
+            image_array = np.clip(image_array, 0, 255).astype(int)
+        
+        pixel_lab = self.rgb_to_lab_batch(image_array)
+        
+        # argmin keeps the first palette entry on ties, like the strict '<'
+        distances = tables.distance(pixel_lab, tables.palette_lab)
+        return np.argmin(distances, axis=-1).astype(np.uint8)
     
     def rgb_to_hex(self, rgb):
         """Convert RGB tuple to hex string"""
         r, g, b = [int(np.clip(c, 0, 255)) for c in rgb]
         return f"#{r:02X}{g:02X}{b:02X}"
     
-    def generate_mosaic(self, image, width, height):
+    def generate_mosaic(self, image, width, height, **options):
+        """Generate Rubik's cube mosaic in the legacy nested-dict shape
+        
+        ``options`` are passed on to generate_mosaic_result.
+        """
+        return self.generate_mosaic_result(image, width, height, **options).to_dict()
+    
+    def decode_image(self, source, width, height, timer=None):
+        """Open an upload and decode it only as large as the mosaic needs
+        
+        JPEGs are decoded in draft mode, which scales by 1/2, 1/4 or 1/8
+        inside the DCT, so full-resolution pixels are never materialized.
+        Other formats are box-reduced by an integer factor after decoding.
+        Both stop at PRE_REDUCE_FACTOR times the target size, so the final
+        LANCZOS resample in generate_mosaic_result keeps its quality.
+        """
+        with timed_stage(timer, 'decode'):
+            try:
+                image = Image.open(source)
+            except Image.DecompressionBombError as e:
+                # PIL's own limit (MAX_IMAGE_PIXELS) can trip before ours
+                raise ImageTooLargeError(str(e)) from e
+            
+            pixel_count = image.width * image.height
+            if self.max_input_pixels and pixel_count > self.max_input_pixels:
+                raise ImageTooLargeError(
+                    f"Image is {image.width}x{image.height} ({pixel_count} pixels), "
+                    f"the limit is {self.max_input_pixels} pixels"
+                )
+            
+            min_width = width * 3 * self.PRE_REDUCE_FACTOR
+            min_height = height * 3 * self.PRE_REDUCE_FACTOR
+            
+            if image.format == 'JPEG':
+                image.draft('RGB', (min_width, min_height))
+            image.load()
+        
+        with timed_stage(timer, 'pre_reduce'):
+            factor = min(image.width // min_width, image.height // min_height)
+            if factor >= 2:
+                # Match the RGB conversion the resize stage would apply
+                if image.mode != 'RGB':
+                    image = image.convert('RGB')
+                image = image.reduce(factor)
+        
+        return image
+    
+    def generate_mosaic_result(self, image, width, height, timer=None, enhancement=None,
+                               palette=None, metric=None, dither=None):
         """Generate Rubik's cube mosaic with proper 3x3 face resolution
         
         CRITICAL UNDERSTANDING:
         - For a 32x32 cube mosaic, we need 96x96 pixels (32*3 = 96)
         - Each cube has a 3x3 face pattern
         - Each pixel in the resized image becomes one face of a cube
-        """
-        print(f"🎯 Starting mosaic generation: {width}x{height} cubes")
         
-        # Convert to RGB if not already
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
+        ``enhancement`` overrides entries of DEFAULT_ENHANCEMENT; ``palette``
+        and ``metric`` pick a registered palette and distance metric instead
+        of the generator's defaults, and ``dither`` one of DITHER_MODES.
+        Returns a MosaicResult backed by a single palette-index array.
+        """
+        logger.debug("Starting mosaic generation: %dx%d cubes", width, height)
         
         # CRITICAL: Calculate the exact pixel resolution needed
         # Each cube needs 3x3 pixels for its face pattern
         target_pixel_width = width * 3
         target_pixel_height = height * 3
         
-        print(f"📐 Target resolution: {target_pixel_width}x{target_pixel_height} pixels")
-        print(f"📊 Each cube maps to exactly 3x3 pixels")
+        with timed_stage(timer, 'resize'):
+            # Convert to RGB if not already
+            if image.mode != 'RGB':
+                image = image.convert('RGB')
+            
+            # Resize image to exact target size
+            resized_image = image.resize(
+                (target_pixel_width, target_pixel_height), 
+                Image.Resampling.LANCZOS
+            )
         
-        # Resize image to exact target size
-        resized_image = image.resize(
-            (target_pixel_width, target_pixel_height), 
-            Image.Resampling.LANCZOS
-        )
+        with timed_stage(timer, 'enhance'):
+            # Fused contrast/saturation/sharpen straight on the pixel array
+            image_array = self.enhance_array(
+                np.asarray(resized_image),
+                **{**self.DEFAULT_ENHANCEMENT, **(enhancement or {})}
+            )
         
-        # Apply lightweight enhancement
-        enhanced_image = self.enhance_image_lightweight(resized_image)
-        image_array = np.array(enhanced_image)
+        with timed_stage(timer, 'quantize'):
+            # Assign every face its palette index, optionally dithered
+            tables = self.palette_tables(palette, metric)
+            index_array = self.dither_image_array(image_array, dither, tables=tables)
         
-        print(f"✅ Image processed to {image_array.shape}")
+        result = MosaicResult(
+            index_array,
+            tables.palette.color_names,
+            tables.palette.hex,
+            width,
+            height,
+            pixel_resolution=f"{target_pixel_width}x{target_pixel_height}"
+        )
         
-        # Initialize grids
-        detailed_grid = []  # For PDF with 3x3 faces per cube
-        simple_grid = []    # For website with dominant colors
-        color_count = {}
+        logger.debug("Mosaic complete: %dx%d pixels, %d faces",
+                     target_pixel_width, target_pixel_height, width * height * 9)
         
-        # Process each cube
-        for cube_y in range(height):
-            detailed_row = []
-            simple_row = []
-            
-            for cube_x in range(width):
-                # Extract exactly 3x3 pixel region for this cube
-                start_x = cube_x * 3
-                start_y = cube_y * 3
-                end_x = start_x + 3
-                end_y = start_y + 3
-                
-                # Get the 3x3 pixel block
-                cube_region = image_array[start_y:end_y, start_x:end_x]
-                
-                # Convert each pixel to a cube face
-                cube_faces = []
-                face_colors = []
-                
-                for face_y in range(3):
-                    face_row = []
-                    for face_x in range(3):
-                        # Get the exact pixel color
-                        pixel_rgb = cube_region[face_y, face_x]
-                        
-                        # Find closest Rubik's color
-                        closest_rgb, closest_name = self.find_closest_rubik_color_fast(pixel_rgb)
-                        
-                        face_data = {
-                            'color': self.rgb_to_hex(closest_rgb),
-                            'name': closest_name
-                        }
-                        face_row.append(face_data)
-                        face_colors.append(face_data['color'])
-                        
-                        # Count colors
-                        color_count[face_data['color']] = color_count.get(face_data['color'], 0) + 1
-                    
-                    cube_faces.append(face_row)
-                
-                # Store detailed cube data for PDF
-                cube_data = {
-                    'faces': cube_faces,
-                    'position': {'x': cube_x, 'y': cube_y}
-                }
-                detailed_row.append(cube_data)
-                
-                # Get dominant color for website display
-                dominant_color = max(set(face_colors), key=face_colors.count)
-                simple_row.append(dominant_color)
-            
-            detailed_grid.append(detailed_row)
-            simple_grid.append(simple_row)
-            
-            # Progress indicator
-            if (cube_y + 1) % 10 == 0 or cube_y == height - 1:
-                print(f"🔄 Processed {cube_y + 1}/{height} rows")
-        
-        total_faces = width * height * 9
-        print(f"✅ Mosaic complete: {len(color_count)} unique colors, {total_faces} total faces")
-        
-        return {
-            'grid': self.create_expanded_display_grid(detailed_grid, width, height),  # 3x expanded for website
-            'detailed_grid': detailed_grid,
-            'colorCount': color_count,
-            'dimensions': {
-                'width': width,
-                'height': height,
-                'display_width': width * 3,  # Actual display width (3x3 per cube)
-                'display_height': height * 3,  # Actual display height (3x3 per cube)
-                'total': width * height,
-                'total_faces': total_faces,
-                'pixel_resolution': f"{target_pixel_width}x{target_pixel_height}"
-            }
-        }
-    
-    def create_expanded_display_grid(self, detailed_grid, cube_width, cube_height):
-        """Create expanded 3x3 grid for website display"""
-        # Calculate final dimensions: each cube becomes 3x3 pixels
-        final_height = cube_height * 3
-        final_width = cube_width * 3
-        
-        # Create the expanded grid
-        expanded_grid = []
-        
-        for cube_row in range(cube_height):
-            # For each cube row, we need to create 3 pixel rows
-            for face_row in range(3):
-                pixel_row = []
-                
-                for cube_col in range(cube_width):
-                    # Get the cube data
-                    cube_data = detailed_grid[cube_row][cube_col]
-                    
-                    # Add the 3 face colors from this face row
-                    for face_col in range(3):
-                        face_color = cube_data['faces'][face_row][face_col]['color']
-                        pixel_row.append(face_color)
-                
-                expanded_grid.append(pixel_row)
-        
-        print(f"✅ Created expanded display grid: {len(expanded_grid)}×{len(expanded_grid[0])} pixels")
-        return expanded_grid
+        return result
 
 # Create a global instance for backwards compatibility
 MosaicGenerator = OptimizedMosaicGenerator
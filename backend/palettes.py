@@ -0,0 +1,105 @@
+import hashlib
+import json
+
+import numpy as np
+
+from color_metrics import get_metric
+
+
+class Palette:
+    """Named set of cube sticker colors
+
+    ``colors`` maps color name -> RGB; its order defines the palette
+    indices stored in a MosaicResult, so at most 256 colors are allowed.
+    """
+
+    def __init__(self, name, colors, display_names=None, description=''):
+        if not 1 <= len(colors) <= 256:
+            raise ValueError(f"Palette '{name}' must have between 1 and 256 colors")
+
+        self.name = name
+        self.description = description
+        self.colors = {color: tuple(int(c) for c in rgb) for color, rgb in colors.items()}
+        self.color_names = list(self.colors)
+        self.rgb = np.array(list(self.colors.values()), dtype=np.uint8)
+        self.hex = [f"#{r:02X}{g:02X}{b:02X}" for r, g, b in self.colors.values()]
+        self.display_names = list(display_names or (color.title() for color in self.color_names))
+
+    @property
+    def fingerprint(self):
+        """Short hash of the colors, for cache keys"""
+        payload = json.dumps([[name, list(rgb)] for name, rgb in self.colors.items()])
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'description': self.description,
+            'colors': [
+                {'index': i, 'name': name, 'displayName': display, 'color': hex_color}
+                for i, (name, display, hex_color)
+                in enumerate(zip(self.color_names, self.display_names, self.hex))
+            ]
+        }
+
+
+class PaletteTables:
+    """Everything needed to match pixels against one palette under one metric
+
+    Built once per (palette, metric) pair by the generator and reused for
+    every request, so switching palettes is free after first use.
+    """
+
+    def __init__(self, palette, metric, palette_lab, lookup_table=None):
+        self.palette = palette
+        self.metric = metric
+        self.distance = get_metric(metric)
+        self.palette_lab = palette_lab
+        self.lookup_table = lookup_table
+
+
+PALETTES = {}
+
+DEFAULT_PALETTE = 'classic'
+
+
+def register_palette(palette):
+    """Make a palette selectable by name; replaces any palette of that name"""
+    PALETTES[palette.name] = palette
+    return palette
+
+
+def get_palette(name=None):
+    """Registered palette called ``name`` (the default if None)
+
+    A Palette instance is returned unchanged.
+    """
+    if isinstance(name, Palette):
+        return name
+    name = name or DEFAULT_PALETTE
+    try:
+        return PALETTES[name]
+    except KeyError:
+        raise ValueError(f"Unknown palette '{name}', "
+                         f"expected one of {', '.join(PALETTES)}") from None
+
+
+# Standard sticker colors
+register_palette(Palette('classic', {
+    'white': (255, 255, 255),
+    'yellow': (255, 213, 0),
+    'orange': (255, 88, 0),
+    'red': (196, 30, 58),
+    'green': (0, 158, 96),
+    'blue': (0, 81, 186)
+}, description="Standard Rubik's cube stickers"))
+
+# Brighter tinted-plastic shades used by stickerless kits
+register_palette(Palette('stickerless', {
+    'white': (255, 255, 255),
+    'yellow': (255, 236, 0),
+    'orange': (255, 128, 0),
+    'red': (228, 0, 43),
+    'green': (0, 200, 83),
+    'blue': (0, 114, 206)
+}, description="Stickerless cubes with tinted plastic tiles"))
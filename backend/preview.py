@@ -0,0 +1,113 @@
+import io
+
+import numpy as np
+from PIL import Image
+
+# Tiles are square, except at the right and bottom edges of a level
+TILE_SIZE = 256
+
+# Zoom level z draws every cube face as 2**z pixels, from 1 up to this
+MAX_FACE_PIXELS = 32
+
+# Longest side of a single preview image when no scale is requested
+PREVIEW_PIXELS = 1024
+
+# Largest single preview allowed, in pixels per side
+MAX_PREVIEW_PIXELS = 8192
+
+# Cube gridlines are drawn in this color, as one extra palette entry
+GRID_COLOR = '#222222'
+
+# Part of every ETag; bump when rendering changes so cached images refresh
+RENDER_VERSION = 2
+
+
+def zoom_levels():
+    return MAX_FACE_PIXELS.bit_length()
+
+
+def fit_scale(result, pixels=PREVIEW_PIXELS):
+    """Largest face size (pixels) at which the whole mosaic fits ``pixels``"""
+    rows, cols = result.indices.shape
+    return int(min(MAX_FACE_PIXELS, max(1, pixels // max(rows, cols))))
+
+
+def render(result, scale, grid=False, top=0, left=0, height=None, width=None):
+    """Palette-index image of a mosaic with every face ``scale`` pixels wide
+
+    ``top``/``left``/``height``/``width`` select a window of the full-size
+    image, so tiles are rendered without rendering the rest. Faces are
+    upscaled nearest-neighbour by a single gather from the index array.
+    Gridlines along cube edges use index ``len(result.palette_hex)``.
+    """
+    rows, cols = result.indices.shape
+    height = rows * scale - top if height is None else height
+    width = cols * scale - left if width is None else width
+    y = np.arange(top, top + height)
+    x = np.arange(left, left + width)
+    image = result.indices[np.ix_(y // scale, x // scale)]
+
+    # At 1 pixel per face a gridline would hide a third of the faces
+    if grid and scale > 1:
+        cube = 3 * scale
+        line = max(1, scale // 4)
+        grid_index = len(result.palette_hex)
+        # A line along the top/left of every cube, plus the closing
+        # bottom/right border of the whole mosaic
+        image[(y % cube < line) | (y >= rows * scale - line), :] = grid_index
+        image[:, (x % cube < line) | (x >= cols * scale - line)] = grid_index
+    return image
+
+
+def encode_png(result, image):
+    """PNG bytes of a palette-index image from render()"""
+    palette = result.palette_hex + [GRID_COLOR]
+    png = Image.fromarray(image, 'P')
+    png.putpalette(b''.join(bytes.fromhex(color.lstrip('#')) for color in palette))
+    buffer = io.BytesIO()
+    # Few colors, so 4-bit pixels halve the data before compression
+    png.save(buffer, 'PNG', bits=4 if len(palette) <= 16 else 8)
+    return buffer.getvalue()
+
+
+def preview_png(result, scale=None, grid=False):
+    """The whole mosaic as one PNG, ``scale`` pixels per face"""
+    scale = scale or fit_scale(result)
+    rows, cols = result.indices.shape
+    if scale < 1 or max(rows, cols) * scale > MAX_PREVIEW_PIXELS:
+        raise ValueError(f"Scale {scale} is out of range for a {cols}x{rows} face mosaic "
+                         f"(at most {MAX_PREVIEW_PIXELS} pixels per side)")
+    return encode_png(result, render(result, scale, grid))
+
+
+def tile_layout(result):
+    """Size and tile count of every zoom level, for tile clients"""
+    rows, cols = result.indices.shape
+    levels = []
+    for level in range(zoom_levels()):
+        scale = 2 ** level
+        width, height = cols * scale, rows * scale
+        levels.append({
+            'level': level,
+            'scale': scale,
+            'width': width,
+            'height': height,
+            'columns': -(-width // TILE_SIZE),
+            'rows': -(-height // TILE_SIZE)
+        })
+    return {'tileSize': TILE_SIZE, 'levels': levels}
+
+
+def tile_png(result, level, column, row, grid=False):
+    """One TILE_SIZE tile of zoom ``level`` as PNG"""
+    if not 0 <= level < zoom_levels():
+        raise ValueError(f"Zoom level {level} out of range 0-{zoom_levels() - 1}")
+    scale = 2 ** level
+    rows, cols = result.indices.shape
+    top, left = row * TILE_SIZE, column * TILE_SIZE
+    if row < 0 or column < 0 or top >= rows * scale or left >= cols * scale:
+        raise ValueError(f"Tile {column},{row} is outside zoom level {level}")
+
+    height = min(TILE_SIZE, rows * scale - top)
+    width = min(TILE_SIZE, cols * scale - left)
+    return encode_png(result, render(result, scale, grid, top, left, height, width))
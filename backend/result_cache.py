@@ -0,0 +1,339 @@
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from mosaic_result import MosaicResult
+
+logger = logging.getLogger(__name__)
+
+
+def pack_result(result):
+    """(indices, metadata) pair holding everything needed to rebuild a result"""
+    meta = {
+        'color_names': result.color_names,
+        'palette_hex': result.palette_hex,
+        'width': result.width,
+        'height': result.height,
+        'pixel_resolution': result.pixel_resolution
+    }
+    return result.indices, meta
+
+
+def unpack_result(indices, meta):
+    """Fresh MosaicResult from a packed entry, with no lazy views built yet"""
+    return MosaicResult(
+        indices,
+        meta['color_names'],
+        meta['palette_hex'],
+        meta['width'],
+        meta['height'],
+        meta['pixel_resolution']
+    )
+
+
+class MosaicResultCache:
+    """Content-addressed cache of generated mosaics
+
+    Keys are the SHA-256 of the upload's digest plus every generation
+    parameter. Entries live in a bounded in-memory LRU tier and, when
+    ``disk_dir`` is set, in an on-disk tier of .npz files that survives
+    restarts and is shared by every worker using the same directory.
+
+    Only the index array and palette are stored; lazy legacy views are
+    never cached, so an entry costs roughly ``width * height * 9`` bytes.
+    """
+
+    def __init__(self, max_memory_bytes=64 * 1024 * 1024, disk_dir=None,
+                 max_disk_bytes=512 * 1024 * 1024):
+        self.max_memory_bytes = max_memory_bytes
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+
+        self._entries = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def digest(image_bytes):
+        """SHA-256 hex digest identifying an upload's content"""
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    @staticmethod
+    def make_key(upload_digest, **params):
+        """Hash of the upload's digest plus all parameters that affect the result"""
+        digest = hashlib.sha256(upload_digest.encode('ascii'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        return digest.hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, f"{key}.npz")
+
+    def get(self, key):
+        """Cached MosaicResult for ``key``, or None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.memory_hits += 1
+                return unpack_result(*entry)
+
+        if self.disk_dir:
+            entry = self._load_from_disk(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                    self.disk_hits += 1
+                    self._store_in_memory(key, entry)
+                return unpack_result(*entry)
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, result):
+        entry = pack_result(result)
+        with self._lock:
+            self._store_in_memory(key, entry)
+        if self.disk_dir:
+            self._save_to_disk(key, entry)
+
+    def _store_in_memory(self, key, entry):
+        """Insert and evict least recently used entries (lock held)"""
+        size = entry[0].nbytes
+        if size > self.max_memory_bytes:
+            return
+
+        previous = self._entries.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= previous[0].nbytes
+
+        self._entries[key] = entry
+        self._memory_bytes += size
+
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self._memory_bytes -= evicted[0].nbytes
+            self.evictions += 1
+
+    def _load_from_disk(self, key):
+        path = self._disk_path(key)
+        try:
+            with np.load(path) as data:
+                indices = data['indices']
+                meta = json.loads(data['meta'].item())
+            # Touch so disk eviction is least-recently-used as well
+            os.utime(path)
+            return indices, meta
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning("Ignoring unreadable cache file %s: %s", path, e)
+            return None
+
+    def _save_to_disk(self, key, entry):
+        indices, meta = entry
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, suffix='.npz.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                np.savez(f, indices=indices, meta=np.array(json.dumps(meta)))
+            os.replace(tmp_path, self._disk_path(key))
+            self._evict_disk()
+        except OSError as e:
+            logger.warning("Could not write cache file for %s: %s", key, e)
+
+    def _evict_disk(self):
+        """Delete least recently used files until under max_disk_bytes"""
+        files = []
+        total = 0
+        for item in os.scandir(self.disk_dir):
+            if item.name.endswith('.npz') and item.is_file():
+                stat = item.stat()
+                files.append((stat.st_mtime, stat.st_size, item.path))
+                total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_disk_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+                with self._lock:
+                    self.disk_evictions += 1
+            except FileNotFoundError:
+                pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'disk_evictions': self.disk_evictions,
+                'entries': len(self._entries),
+                'memory_bytes': self._memory_bytes,
+                'disk_enabled': bool(self.disk_dir)
+            }
+
+
+class ExpiringStore:
+    """Values addressed by a short ID, with a sliding TTL and a byte budget
+
+    Entries expire ``ttl`` seconds after their last use, and the least
+    recently used entries are evicted once the stored values exceed
+    ``max_bytes``. Subclasses decide what is stored and how big it is.
+    ``clock`` returns the current time in seconds.
+    """
+
+    def __init__(self, ttl=3600, max_bytes=128 * 1024 * 1024, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.clock = clock
+
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.expirations = 0
+        self.evictions = 0
+
+    def _remove(self, entry_id):
+        """Drop an entry and its byte accounting (lock held)"""
+        _, _, size = self._entries.pop(entry_id)
+        self._bytes -= size
+
+    def _expire(self, now):
+        """Drop entries whose TTL has passed (lock held)
+
+        Every use moves an entry to the end with a fresh expiry, so expired
+        entries are always at the front.
+        """
+        while self._entries:
+            entry_id, (expires_at, _, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            self._remove(entry_id)
+            self.expirations += 1
+
+    def _put(self, entry_id, value, size):
+        """Store ``value`` under ``entry_id``; None if it exceeds max_bytes"""
+        if size > self.max_bytes:
+            return None
+
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            if entry_id in self._entries:
+                self._remove(entry_id)
+
+            self._entries[entry_id] = (now + self.ttl, value, size)
+            self._bytes += size
+
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry_id
+
+    def _get(self, entry_id):
+        """Stored value, or None if unknown or expired"""
+        now = self.clock()
+        with self._lock:
+            self._expire(now)
+            item = self._entries.get(entry_id)
+            if item is None:
+                return None
+            # Using an entry extends its lifetime
+            self._entries[entry_id] = (now + self.ttl, item[1], item[2])
+            self._entries.move_to_end(entry_id)
+            return item[1]
+
+    def stats(self):
+        with self._lock:
+            self._expire(self.clock())
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'expirations': self.expirations,
+                'evictions': self.evictions,
+                'ttl_seconds': self.ttl
+            }
+
+
+class MosaicStore(ExpiringStore):
+    """Server-side mosaic results addressed by a short ID
+
+    Lets clients refer to a previous result (e.g. to request its PDF)
+    instead of posting the whole grid back. Only the index arrays count
+    towards ``max_bytes``.
+    """
+
+    def put(self, mosaic_id, result):
+        entry = pack_result(result)
+        return self._put(mosaic_id, entry, entry[0].nbytes)
+
+    def get(self, mosaic_id):
+        """Stored MosaicResult, or None if unknown or expired"""
+        entry = self._get(mosaic_id)
+        return None if entry is None else unpack_result(*entry)
+
+
+class WorkingImage:
+    """Decoded, pre-reduced RGB copy of an upload
+
+    ``decode_size`` is the mosaic size in cubes (width, height) the copy was
+    reduced for; it can serve any mosaic up to that size.
+    """
+
+    def __init__(self, image, upload_digest, decode_size):
+        self.image = image
+        self.upload_digest = upload_digest
+        self.decode_size = tuple(decode_size)
+
+    @property
+    def nbytes(self):
+        return self.image.width * self.image.height * 3
+
+    def covers(self, width, height):
+        return width <= self.decode_size[0] and height <= self.decode_size[1]
+
+
+class UploadStore(ExpiringStore):
+    """Working copies of uploads, addressed by upload ID
+
+    Regenerating with new dimensions or settings starts from the working
+    copy, so the upload, decode and pre-reduce stages are skipped. The
+    stored SHA-256 digest of the original bytes keeps result cache keys
+    tied to the upload's content.
+    """
+
+    @staticmethod
+    def make_id(upload_digest):
+        """Upload ID of an upload; identical bytes share one working copy"""
+        return upload_digest[:16]
+
+    def put(self, upload_id, working):
+        return self._put(upload_id, working, working.nbytes)
+
+    def get(self, upload_id):
+        """Stored WorkingImage, or None if unknown or expired"""
+        return self._get(upload_id)
@@ -0,0 +1,163 @@
+import base64
+import json
+import zlib
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # the standard library encoder is used instead
+    orjson = None
+
+# Response compression, in order of preference
+CONTENT_ENCODINGS = ('gzip', 'deflate')
+
+# Bodies smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+COMPRESSION_LEVEL = 6
+
+
+def dumps(obj):
+    """Compact JSON bytes, via orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def byte_table(values):
+    """(N, width) uint8 table of JSON-encoded values, space-padded to one width
+
+    Trailing spaces are insignificant in JSON, so padding every encoded
+    value to the same width lets whole arrays of them be gathered by index.
+    """
+    encoded = [dumps(value) for value in values]
+    width = max(len(item) for item in encoded)
+    padded = b''.join(item.ljust(width) for item in encoded)
+    return np.frombuffer(padded, dtype=np.uint8).reshape(len(encoded), width)
+
+
+def literal(text):
+    return np.frombuffer(text, dtype=np.uint8)[np.newaxis, np.newaxis, :]
+
+
+def json_matrix(cells):
+    """JSON array of rows from an (H, W, k) uint8 array of padded JSON values"""
+    height, width, size = cells.shape
+    if not height or not width:
+        return b'[' + b','.join([b'[]'] * height) + b']'
+
+    # Each value is followed by ',' or, at the end of a row, ']'
+    items = np.empty((height, width, size + 1), dtype=np.uint8)
+    items[..., :size] = cells
+    items[..., size] = ord(',')
+    items[:, -1, size] = ord(']')
+
+    # Each row is '[' + items and then ',' or, after the last row, ']'
+    rows = np.empty((height, width * (size + 1) + 2), dtype=np.uint8)
+    rows[:, 0] = ord('[')
+    rows[:, 1:-1] = items.reshape(height, -1)
+    rows[:, -1] = ord(',')
+    rows[-1, -1] = ord(']')
+    return b'[' + rows.tobytes()
+
+
+def assemble(parts, shape):
+    """Concatenate byte-array parts, broadcast to ``shape``, along the last axis"""
+    return np.concatenate(
+        [np.broadcast_to(part, shape + part.shape[-1:]) for part in parts],
+        axis=-1
+    )
+
+
+def grid_json(result):
+    """The legacy ``grid`` (3H x 3W hex strings) straight from the index array"""
+    hex_table = byte_table(result.palette_hex)
+    return json_matrix(hex_table[result.indices])
+
+
+def detailed_grid_json(result):
+    """The legacy ``detailed_grid`` (per-cube face dicts) from the index array
+
+    Every cube is one fixed-width record assembled from pre-encoded
+    palette entries and coordinates, so no per-cube Python objects exist.
+    """
+    face_table = byte_table([
+        {'color': color, 'name': name}
+        for color, name in zip(result.palette_hex, result.color_names)
+    ])
+    faces = face_table[result.cube_faces]  # (H, W, 3, 3, width)
+    x_table = byte_table(range(result.width))[np.newaxis, :, :]
+    y_table = byte_table(range(result.height))[:, np.newaxis, :]
+
+    parts = [literal(b'{"faces":[[')]
+    for row in range(3):
+        if row:
+            parts.append(literal(b'],['))
+        for col in range(3):
+            if col:
+                parts.append(literal(b','))
+            parts.append(faces[:, :, row, col])
+    parts += [literal(b']],"position":{"x":'), x_table, literal(b',"y":'), y_table, literal(b'}}')]
+    return json_matrix(assemble(parts, (result.height, result.width)))
+
+
+def int_list_json(values):
+    """JSON list of integers from a 1-D integer array"""
+    if orjson is not None:
+        return orjson.dumps(np.ascontiguousarray(values, dtype=np.int64),
+                            option=orjson.OPT_SERIALIZE_NUMPY)
+    return b'[' + ','.join(map(str, values.tolist())).encode('ascii') + b']'
+
+
+def encode_mosaic(result, result_format='legacy'):
+    """Response members for ``result`` as (key, JSON bytes) pairs
+
+    Produces the same JSON as ``json.dumps(result.encode(result_format))``
+    but writes the large arrays directly from the index array instead of
+    building nested lists of strings first.
+    """
+    if result_format == 'legacy':
+        return [
+            ('grid', grid_json(result)),
+            ('detailed_grid', detailed_grid_json(result)),
+            ('colorCount', dumps(result.color_count)),
+            ('dimensions', dumps(result.dimensions))
+        ]
+
+    members = [
+        ('format', dumps(result_format)),
+        ('palette', dumps(result.palette)),
+        ('shape', dumps(list(result.indices.shape))),
+        ('colorCount', dumps(result.color_count)),
+        ('dimensions', dumps(result.dimensions))
+    ]
+    if result_format == 'indices':
+        members.append(('indices', b'"' + base64.b64encode(result.indices.tobytes()) + b'"'))
+    elif result_format == 'rle':
+        values, lengths = result.run_lengths()
+        members.append(('runs', int_list_json(np.column_stack((values, lengths)).ravel())))
+    else:
+        # Let MosaicResult raise its usual error for unknown formats
+        result.encode(result_format)
+    return members
+
+
+def json_object(members, extra=None):
+    """JSON object bytes from pre-encoded (key, value) members plus a plain dict"""
+    members = list(members) + [(key, dumps(value)) for key, value in (extra or {}).items()]
+    return b'{' + b','.join(dumps(key) + b':' + value for key, value in members) + b'}'
+
+
+def compress(body, encoding, level=COMPRESSION_LEVEL):
+    """``body`` compressed with a CONTENT_ENCODINGS entry
+
+    'deflate' is the zlib format, as HTTP defines it.
+    """
+    if encoding == 'gzip':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    elif encoding == 'deflate':
+        compressor = zlib.compressobj(level, zlib.DEFLATED, zlib.MAX_WBITS)
+    else:
+        raise ValueError(f"Unsupported content encoding '{encoding}'")
+    return compressor.compress(body) + compressor.flush()
@@ -0,0 +1,66 @@
+"""Synthetic inputs and slow reference implementations shared by the tests
+and benchmark.py"""
+import numpy as np
+
+from dithering import ERROR_DIFFUSION_KERNELS
+from result_cache import unpack_result
+
+
+def synthetic_image_array(cubes, seed=0):
+    """Smooth gradients plus noise, sized for a cubes x cubes mosaic"""
+    size = cubes * 3
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:size, 0:size] / max(size - 1, 1)
+    base = np.stack([x, y, 1 - (x + y) / 2], axis=-1) * 255
+    noise = rng.normal(0, 25, base.shape)
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def random_result(seed, cubes=4):
+    """Two-color MosaicResult of cubes x cubes with random faces"""
+    indices = np.random.default_rng(seed).integers(0, 2, size=(cubes * 3, cubes * 3), dtype=np.uint8)
+    return unpack_result(indices, {
+        'color_names': ['white', 'red'],
+        'palette_hex': ['#FFFFFF', '#FF0000'],
+        'width': cubes,
+        'height': cubes,
+        'pixel_resolution': None
+    })
+
+
+def legacy_quantize(generator, image_array):
+    """The original per-pixel matching loop, kept as the baseline
+
+    Euclidean LAB distance to each color of the default palette, keeping
+    the first color on ties.
+    """
+    out = np.empty(image_array.shape[:2], dtype=np.uint8)
+    for y in range(image_array.shape[0]):
+        for x in range(image_array.shape[1]):
+            pixel_lab = generator.rgb_to_lab_fast(np.clip(image_array[y, x], 0, 255).astype(int))
+            min_distance = float('inf')
+            for index, lab_color in enumerate(generator.palette_lab):
+                distance = np.sqrt(np.sum((pixel_lab - lab_color) ** 2))
+                if distance < min_distance:
+                    min_distance = distance
+                    out[y, x] = index
+    return out
+
+
+def legacy_error_diffusion(generator, image_array, kernel):
+    """Pixel-by-pixel error diffusion, the reference for the wavefront version"""
+    weights = ERROR_DIFFUSION_KERNELS[kernel]
+    palette_rgb = generator.palette.rgb.astype(np.float32)
+    height, width = image_array.shape[:2]
+    pixels = image_array.astype(np.float32)
+    output = np.empty((height, width), dtype=np.uint8)
+    for y in range(height):
+        for x in range(width):
+            value = np.clip(pixels[y, x], 0, 255)
+            index = generator.nearest_palette_indices(np.rint(value).astype(np.uint8))
+            output[y, x] = index
+            error = value - palette_rgb[index]
+            for dy, dx, weight in weights:
+                if 0 <= y + dy < height and 0 <= x + dx < width:
+                    pixels[y + dy, x + dx] += error * np.float32(weight)
+    return output
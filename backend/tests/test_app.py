@@ -0,0 +1,140 @@
+import io
+import json
+import zipfile
+
+import pytest
+from PIL import Image
+
+from app import app, job_queue
+from tests.helpers import synthetic_image_array
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.mark.parametrize('layout', ['0x3', 'abc', '4x3x2', '13x1'])
+def test_invalid_instruction_layout_is_rejected(client, layout):
+    for url in ('/api/generate-pdf', '/api/jobs/pdf'):
+        response = client.post(url, json={'mosaicId': 'unknown', 'settings': {'instructionLayout': layout}})
+        assert response.status_code == 400
+        assert 'layout' in response.get_json()['error']
+
+
+def test_batch_is_rejected_when_queue_is_full(client):
+    image = io.BytesIO()
+    Image.fromarray(synthetic_image_array(64, 48)).save(image, 'PNG')
+    job_queue.reserve(job_queue.max_pending)
+    try:
+        response = client.post('/api/batch', data={
+            'images': (io.BytesIO(image.getvalue()), 'a.png'),
+            'variants': '[{"width": 3, "height": 3}]'
+        }, content_type='multipart/form-data')
+    finally:
+        job_queue.release(job_queue.max_pending)
+    assert response.status_code == 429
+
+
+def test_pdf_from_posted_mosaic_data(client):
+    grid = [['#FFFFFF', '#B71234', '#FFFFFF']] * 3
+    response = client.post('/api/generate-pdf', json={'mosaicData': {'grid': grid}, 'settings': {}})
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.data.startswith(b'%PDF')
+
+
+@pytest.mark.parametrize('width', ['0', '-3', '513', '100000', 'abc'])
+def test_out_of_range_mosaic_size_is_rejected(client, width):
+    image = io.BytesIO()
+    Image.fromarray(synthetic_image_array(4)).save(image, 'PNG')
+    response = client.post('/api/generate-mosaic', data={
+        'image': (io.BytesIO(image.getvalue()), 'a.png'), 'width': width, 'height': '8'
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400
+    assert 'width' in response.get_json()['error']
+
+    response = client.post('/api/batch', data={
+        'images': (io.BytesIO(image.getvalue()), 'a.png'),
+        'variants': json.dumps([{'width': 8, 'height': 8}, {'width': width, 'height': 8}])
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+def png_upload(seed):
+    image = io.BytesIO()
+    Image.fromarray(synthetic_image_array(40, seed=seed)).save(image, 'PNG')
+    return image.getvalue()
+
+
+def generate(client, width, upload):
+    data = {'width': str(width), 'height': str(width)}
+    if isinstance(upload, bytes):
+        data['image'] = (io.BytesIO(upload), 'a.png')
+    else:
+        data['uploadId'] = upload
+    response = client.post('/api/generate-mosaic', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_regenerating_by_upload_id_skips_decoding(client):
+    first = generate(client, 16, png_upload(seed=101))
+    assert first['timings']['decode'] is not None
+
+    second = generate(client, 20, first['uploadId'])
+    assert second['timings']['decode'] is None
+    assert second['timings']['pre_reduce'] is None
+    assert second['timings']['resize'] is not None
+    assert second['dimensions']['width'] == 20
+
+
+def test_smaller_reupload_keeps_the_larger_working_copy(client):
+    upload = png_upload(seed=102)
+    large = generate(client, 100, upload)
+
+    # The same bytes again, for a smaller mosaic, reuse the stored copy
+    small = generate(client, 16, upload)
+    assert small['timings']['decode'] is None
+    assert small['uploadId'] == large['uploadId']
+
+    again = generate(client, 90, large['uploadId'])
+    assert again['timings']['decode'] is None
+    assert again['dimensions']['width'] == 90
+
+
+def test_batch_zip_lists_every_variant(client):
+    variants = [{'width': 4, 'height': 3}, {'width': 6, 'height': 6, 'palette': 'stickerless'}]
+    response = client.post('/api/batch', data={
+        'images': [(io.BytesIO(png_upload(seed=103)), 'one.png'),
+                   (io.BytesIO(png_upload(seed=104)), 'two.png')],
+        'variants': json.dumps(variants)
+    }, content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert job_queue.metrics()['reserved'] > 0
+
+    archive = zipfile.ZipFile(io.BytesIO(response.data))
+    response.close()
+    assert job_queue.metrics()['reserved'] == 0
+
+    manifest = json.loads(archive.read('manifest.json'))
+    assert manifest['failed'] == 0
+    items = manifest['items']
+    assert [(item['image'], item['variant']) for item in items] == [
+        ('one.png', 0), ('one.png', 1), ('two.png', 0), ('two.png', 1)
+    ]
+    for item in items:
+        variant = variants[item['variant']]
+        assert (item['width'], item['height']) == (variant['width'], variant['height'])
+        assert item['palette'] == variant.get('palette', 'classic')
+        mosaic = json.loads(archive.read(f"{item['path']}.json"))
+        assert mosaic['dimensions']['width'] == variant['width']
+        assert mosaic['mosaicId'] == item['mosaicId']
+
+
+@pytest.mark.parametrize('mosaic_id', [123, ['abc'], {'id': 'abc'}])
+def test_non_string_mosaic_id_is_rejected(client, mosaic_id):
+    for url in ('/api/generate-pdf', '/api/jobs/pdf'):
+        response = client.post(url, json={'mosaicId': mosaic_id, 'settings': {}})
+        assert response.status_code == 400
+        assert 'mosaicId' in response.get_json()['error']
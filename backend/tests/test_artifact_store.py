@@ -0,0 +1,56 @@
+import os
+
+import numpy as np
+
+from artifact_store import ArtifactStore
+from result_cache import unpack_result
+
+
+def make_result(seed):
+    indices = np.random.default_rng(seed).integers(0, 2, size=(30, 30), dtype=np.uint8)
+    return unpack_result(indices, {
+        'color_names': ['white', 'red'],
+        'palette_hex': ['#ffffff', '#ff0000'],
+        'width': 10,
+        'height': 10,
+        'pixel_resolution': 3
+    })
+
+
+def test_writes_update_index_without_rescanning(tmp_path, monkeypatch):
+    store = ArtifactStore(str(tmp_path), rescan_interval=3600)
+    scans = []
+    monkeypatch.setattr(store, '_scan', lambda: scans.append(1))
+
+    store.put_result('a1', make_result(1))
+    store.put_result('a1', make_result(1))
+    path = store.put_pdf('a1', {}, lambda f: f.write(b'%PDF' * 100))
+
+    assert scans == []
+    on_disk = sum(entry.stat().st_size for entry in os.scandir(tmp_path / 'a1'))
+    assert store.stats()['bytes'] == on_disk
+    assert path == str(tmp_path / 'a1' / f"guide-{ArtifactStore.pdf_key({})}.pdf")
+
+
+def test_evicts_least_recently_used(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    store.put_result('a1', make_result(1))
+    size = store.stats()['bytes']
+    store.max_bytes = size * 2
+    store.put_result('a2', make_result(2))
+    assert store.get_result('a1') is not None
+
+    store.put_result('a3', make_result(3))
+    assert store.get_result('a2') is None
+    assert store.get_result('a1') is not None
+    stats = store.stats()
+    assert stats['mosaics'] == 2
+    assert stats['evictions'] == 1
+    assert stats['bytes'] <= store.max_bytes
+
+
+def test_non_string_ids_are_not_found(tmp_path):
+    store = ArtifactStore(str(tmp_path))
+    for mosaic_id in (123, None, '../etc', ['a1']):
+        assert store.get_result(mosaic_id) is None
+        assert store.pdf_path(mosaic_id, {}) is None
@@ -0,0 +1,31 @@
+import io
+import struct
+import zlib
+
+import pytest
+
+from optimized_mosaic_generator import ImageTooLargeError, OptimizedMosaicGenerator
+
+
+def png_header(width, height):
+    """A PNG that only declares its size; Image.open never reads pixels"""
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0)
+    return b'\x89PNG\r\n\x1a\n' + chunk(b'IHDR', ihdr) + chunk(b'IEND', b'')
+
+
+@pytest.mark.parametrize('max_input_pixels', [None, 64_000_000, 500_000_000])
+def test_oversized_uploads_raise_image_too_large(max_input_pixels):
+    generator = OptimizedMosaicGenerator(max_input_pixels=max_input_pixels)
+    # 400 MP is past PIL's own decompression bomb limit as well
+    with pytest.raises(ImageTooLargeError):
+        generator.decode_image(io.BytesIO(png_header(20000, 20000)), 16, 16)
+
+
+def test_oversized_upload_is_413():
+    from app import app
+    response = app.test_client().post('/api/generate-mosaic', data={
+        'image': (io.BytesIO(png_header(20000, 20000)), 'huge.png'), 'width': 16, 'height': 16
+    }, content_type='multipart/form-data')
+    assert response.status_code == 413
@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+from dithering import ERROR_DIFFUSION_KERNELS
+from optimized_mosaic_generator import OptimizedMosaicGenerator
+from tests.helpers import legacy_error_diffusion, synthetic_image_array
+
+
+@pytest.mark.parametrize('kernel', sorted(ERROR_DIFFUSION_KERNELS))
+def test_wavefront_error_diffusion_matches_raster_order(kernel):
+    generator = OptimizedMosaicGenerator()
+    image_array = synthetic_image_array(6, seed=2)[:, :14]
+    expected = legacy_error_diffusion(generator, image_array, kernel)
+    assert np.array_equal(generator.dither_image_array(image_array, kernel), expected)
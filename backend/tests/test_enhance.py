@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from optimized_mosaic_generator import OptimizedMosaicGenerator
+from tests.helpers import synthetic_image_array
+
+# enhance_array may differ from the chained PIL passes by a few levels
+MAX_MEAN_DIFF = 1.0
+MAX_DIFF = 8
+
+
+@pytest.mark.parametrize('cubes', [8, 32, 100])
+def test_fused_enhancement_matches_pil(cubes):
+    generator = OptimizedMosaicGenerator()
+    image_array = synthetic_image_array(cubes, seed=cubes)
+
+    expected = np.array(generator.enhance_image_lightweight(Image.fromarray(image_array)))
+    actual = generator.enhance_array(image_array)
+
+    assert actual.dtype == np.uint8 and actual.shape == expected.shape
+    diff = np.abs(expected.astype(np.int16) - actual.astype(np.int16))
+    assert diff.mean() <= MAX_MEAN_DIFF
+    assert diff.max() <= MAX_DIFF
@@ -0,0 +1,46 @@
+import time
+
+import pytest
+
+from job_queue import JobQueue, QueueFullError
+
+
+@pytest.fixture
+def job_queue():
+    queue = JobQueue(max_workers=1, max_pending=4)
+    yield queue
+    queue.shutdown()
+
+
+def wait_for(condition, timeout=60):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+def test_queue_depth_counts_only_started_jobs_as_running(job_queue):
+    job_ids = [job_queue.submit('sleep', time.sleep, 0.5) for _ in range(3)]
+    wait_for(lambda: job_queue.get(job_ids[0]).state == 'running')
+
+    metrics = job_queue.metrics()
+    assert metrics['running'] == 1
+    assert metrics['queued'] == 2
+
+    wait_for(lambda: all(job_queue.get(job_id).state == 'done' for job_id in job_ids))
+    for job_id in job_ids:
+        assert job_queue.get(job_id).to_dict()['wait_seconds'] >= 0
+    assert job_queue.metrics()['completed'] == 3
+
+
+def test_reserved_capacity_counts_against_max_pending(job_queue):
+    job_queue.reserve(3)
+    job_queue.submit('sleep', time.sleep, 0)
+    with pytest.raises(QueueFullError):
+        job_queue.submit('sleep', time.sleep, 0)
+    with pytest.raises(QueueFullError):
+        job_queue.reserve(1)
+
+    job_queue.release(3)
+    job_queue.reserve(3)
+    assert job_queue.metrics()['reserved'] == 3
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from color_lookup_table import ColorLookupTable
+from optimized_mosaic_generator import OptimizedMosaicGenerator
+from palettes import get_palette
+from tests.helpers import synthetic_image_array
+
+BITS = 6
+
+
+@pytest.fixture(scope='module')
+def generator():
+    return OptimizedMosaicGenerator()
+
+
+def test_cache_key_depends_on_palette_metric_and_bits():
+    classic = get_palette('classic').colors
+    keys = {
+        ColorLookupTable.cache_key(classic, 'lab_euclidean', BITS),
+        ColorLookupTable.cache_key(classic, 'ciede2000', BITS),
+        ColorLookupTable.cache_key(get_palette('stickerless').colors, 'lab_euclidean', BITS),
+        ColorLookupTable.cache_key(classic, 'lab_euclidean', BITS + 1)
+    }
+    assert len(keys) == 4
+    assert ColorLookupTable.cache_key(dict(classic), 'lab_euclidean', BITS) in keys
+
+
+@pytest.mark.parametrize('contents', [
+    lambda path: np.save(path, np.zeros((4, 4, 4), dtype=np.uint8)),
+    lambda path: open(path, 'wb').write(b'not a numpy file')
+], ids=['stale', 'corrupt'])
+def test_bad_cached_table_is_rebuilt(generator, tmp_path, contents):
+    palette = generator.palette.colors
+    path = ColorLookupTable.cache_path(palette, 'lab_euclidean', BITS, str(tmp_path))
+    contents(path)
+
+    lookup_table = ColorLookupTable.load_or_build(generator.nearest_palette_indices, palette, 'lab_euclidean',
+                                                  bits=BITS, cache_dir=str(tmp_path))
+    assert lookup_table.table.shape == (1 << BITS,) * 3
+    assert np.load(path).shape == (1 << BITS,) * 3
+
+
+def test_memory_mapped_table_matches_direct_quantization(generator, tmp_path):
+    def load():
+        return ColorLookupTable.load_or_build(generator.nearest_palette_indices, generator.palette.colors,
+                                              generator.distance_metric, bits=BITS, cache_dir=str(tmp_path))
+    load()
+    lookup_table = load()
+    assert isinstance(lookup_table.table, np.memmap)
+
+    # A coarse table matches exactly at the centre of each bucket
+    shift = 8 - BITS
+    image_array = synthetic_image_array(16)
+    centres = ((image_array >> shift) << shift) + ((1 << shift) >> 1)
+    direct = generator.nearest_palette_indices(centres)
+    assert np.array_equal(lookup_table.lookup(image_array), direct)
+    assert np.array_equal(lookup_table.lookup(centres), direct)
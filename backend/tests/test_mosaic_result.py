@@ -0,0 +1,36 @@
+import numpy as np
+import pytest
+
+from mosaic_result import RESULT_FORMATS, MosaicResult
+from palettes import get_palette
+
+
+@pytest.fixture
+def result():
+    palette = get_palette()
+    indices = np.random.default_rng(0).integers(0, len(palette.hex), (12, 15)).astype(np.uint8)
+    # Long runs as well, so run-length encoding has something to merge
+    indices[:3] = 2
+    return MosaicResult(indices, palette.color_names, palette.hex, 5, 4, pixel_resolution='15x12')
+
+
+@pytest.mark.parametrize('result_format', RESULT_FORMATS)
+def test_encodings_round_trip(result, result_format):
+    decoded = MosaicResult.from_dict(result.encode(result_format), result.color_names, result.palette_hex)
+    assert np.array_equal(decoded.indices, result.indices)
+    assert decoded.palette_hex == result.palette_hex
+    assert decoded.color_names == result.color_names
+    assert (decoded.width, decoded.height) == (result.width, result.height)
+    assert decoded.to_dict() == result.to_dict()
+
+
+def test_legacy_grid_without_palette_keeps_colors_and_names(result):
+    decoded = MosaicResult.from_dict(result.to_dict())
+    assert decoded.grid == result.grid
+    assert decoded.detailed_grid == result.detailed_grid
+
+
+def test_rle_merges_runs(result):
+    runs = result.encode('rle')['runs']
+    assert sum(runs[1::2]) == result.indices.size
+    assert runs[:2] == [2, 45]
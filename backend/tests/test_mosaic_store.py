@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import app as app_module
+from result_cache import MosaicStore
+from tests.helpers import random_result
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_entries_expire_after_ttl_since_last_use(clock):
+    store = MosaicStore(ttl=60, clock=clock)
+    store.put('a', random_result(0))
+    store.put('b', random_result(1))
+
+    clock.now += 50
+    assert store.get('a') is not None
+    clock.now += 20
+    # 'b' was last used 70 s ago, 'a' 20 s ago
+    assert store.get('b') is None
+    assert np.array_equal(store.get('a').indices, random_result(0).indices)
+    assert store.stats()['expirations'] == 1
+
+    clock.now += 61
+    assert store.get('a') is None
+    assert store.stats()['entries'] == 0
+
+
+def test_least_recently_used_entries_are_evicted_over_max_bytes(clock):
+    entry_bytes = random_result(0).indices.nbytes
+    store = MosaicStore(max_bytes=entry_bytes * 2, clock=clock)
+    store.put('a', random_result(0))
+    store.put('b', random_result(1))
+    store.get('a')
+    store.put('c', random_result(2))
+
+    assert store.get('b') is None
+    assert store.get('a') is not None and store.get('c') is not None
+    stats = store.stats()
+    assert (stats['evictions'], stats['entries'], stats['bytes']) == (1, 2, entry_bytes * 2)
+    # Too big to ever fit
+    assert store.put('d', random_result(3, cubes=8)) is None
+
+
+def test_pdf_of_expired_mosaic_id_is_404(monkeypatch, clock):
+    store = MosaicStore(ttl=60, clock=clock)
+    monkeypatch.setattr(app_module, 'mosaic_store', store)
+    monkeypatch.setattr(app_module, 'artifact_store', None)
+    store.put('abc123', random_result(0))
+
+    client = app_module.app.test_client()
+    clock.now += 61
+    response = client.post('/api/generate-pdf', json={'mosaicId': 'abc123', 'settings': {}})
+    assert response.status_code == 404
+    assert 'expired' in response.get_json()['error']
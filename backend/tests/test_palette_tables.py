@@ -0,0 +1,34 @@
+import threading
+import time
+
+import optimized_mosaic_generator
+from optimized_mosaic_generator import OptimizedMosaicGenerator
+
+
+def test_slow_table_build_only_blocks_callers_of_that_table(monkeypatch, tmp_path):
+    load_or_build = optimized_mosaic_generator.ColorLookupTable.load_or_build
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_for_ciede2000(match_indices, palette, metric, **kwargs):
+        if metric == 'ciede2000':
+            started.set()
+            release.wait(10)
+        return load_or_build(match_indices, palette, metric, **kwargs)
+
+    monkeypatch.setattr(optimized_mosaic_generator.ColorLookupTable, 'load_or_build',
+                        staticmethod(slow_for_ciede2000))
+    generator = OptimizedMosaicGenerator(lookup_table_bits=4, lookup_table_dir=str(tmp_path))
+
+    builder = threading.Thread(target=generator.palette_tables, args=(None, 'ciede2000'))
+    builder.start()
+    try:
+        assert started.wait(10)
+        start = time.perf_counter()
+        generator.palette_tables('stickerless')
+        generator.palette_tables()
+        assert time.perf_counter() - start < 5
+    finally:
+        release.set()
+        builder.join()
+    assert generator.palette_tables(metric='ciede2000').lookup_table is not None
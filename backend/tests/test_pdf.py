@@ -0,0 +1,80 @@
+import io
+import math
+import re
+
+import numpy as np
+import pytest
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import SimpleDocTemplate
+
+from fixed_pdf_generator import FixedPDFGenerator, MosaicFlowable
+from mosaic_result import MosaicResult
+from palettes import get_palette
+
+
+def make_result(width, height, seed=0):
+    palette = get_palette()
+    rng = np.random.default_rng(seed)
+    indices = rng.integers(0, len(palette.hex), (height * 3, width * 3)).astype(np.uint8)
+    return MosaicResult(indices, palette.display_names, palette.hex, width, height)
+
+
+@pytest.mark.parametrize('width, height', [(16, 64), (30, 45), (8, 400), (64, 16), (150, 8)])
+def test_mosaic_page_fits_any_aspect_ratio(width, height):
+    pdf = FixedPDFGenerator().generate_pdf(make_result(width, height), {'width': width, 'height': height})
+    assert pdf.getvalue().startswith(b'%PDF')
+
+
+def page_count(pdf_bytes):
+    return len(re.findall(rb'/Type /Page\b(?!s)', pdf_bytes))
+
+
+def test_tall_mosaic_is_split_across_pages_at_min_cell_size():
+    result = make_result(8, 400)
+    generator = FixedPDFGenerator()
+    flowable = generator.create_mosaic_flowable(result)
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter)
+    doc.build([flowable])
+
+    # The default frame has 6 points of padding on every side
+    rows_per_page = int((doc.height - 12) // flowable.min_cell_size)
+    assert page_count(buffer.getvalue()) == math.ceil(result.indices.shape[0] / rows_per_page)
+
+
+@pytest.mark.parametrize('width, height', [(8, 400), (30, 45), (100, 20), (200, 300)])
+def test_split_bands_fit_the_frame(width, height):
+    avail_width, avail_height = 450, 600
+    indices = make_result(width, height).indices
+    pending = [MosaicFlowable(indices, [None] * 6, 20)]
+
+    # Place what fits and split the rest, as reportlab's frames do
+    placed = []
+    while pending:
+        flowable = pending.pop(0)
+        band_width, band_height = flowable.wrap(avail_width, avail_height)
+        assert flowable.cell_size >= 2
+        if band_width <= avail_width and band_height <= avail_height:
+            placed.append(flowable)
+        else:
+            bands = flowable.split(avail_width, avail_height)
+            assert len(bands) == 2
+            pending[:0] = bands
+    assert sum(band.indices.size for band in placed) == indices.size
+    assert len({band.cell_size for band in placed}) == 1
+
+
+def test_cell_size_never_drops_below_min_cell_size():
+    flowable = MosaicFlowable(np.zeros((3000, 30), dtype=np.uint8), [None], 20, min_cell_size=3)
+    flowable.wrap(450, 600)
+    assert flowable.cell_size == 3
+    flowable.wrap(1, 1)
+    assert flowable.cell_size == 3
+
+
+def test_pdf_colors_are_the_palette_rgb():
+    generator = FixedPDFGenerator()
+    for hex_color, rgb in zip(get_palette().hex, get_palette().rgb.tolist()):
+        color = generator.hex_to_color(hex_color)
+        assert [round(channel * 255) for channel in color.rgb()] == rgb
@@ -0,0 +1,80 @@
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app as app_module
+import preview
+from tests.helpers import random_result
+
+ROWS_OF_CUBES = 40
+
+
+@pytest.fixture
+def mosaic_id(monkeypatch):
+    monkeypatch.setattr(app_module, 'artifact_store', None)
+    app_module.mosaic_store.put('preview1', random_result(0, cubes=ROWS_OF_CUBES))
+    return 'preview1'
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
+
+
+def png_size(response):
+    return Image.open(io.BytesIO(response.data)).size
+
+
+def test_preview_is_scale_pixels_per_face(client, mosaic_id):
+    response = client.get(f'/api/mosaics/{mosaic_id}/preview.png?scale=4')
+    assert response.status_code == 200
+    assert png_size(response) == (ROWS_OF_CUBES * 3 * 4,) * 2
+
+    # Without a scale the preview fits PREVIEW_PIXELS
+    fit = client.get(f'/api/mosaics/{mosaic_id}/preview.png')
+    assert png_size(fit) == (ROWS_OF_CUBES * 3 * (preview.PREVIEW_PIXELS // (ROWS_OF_CUBES * 3)),) * 2
+
+
+def test_edge_tiles_are_cropped_and_outside_tiles_are_404(client, mosaic_id):
+    layout = client.get(f'/api/mosaics/{mosaic_id}/tiles').get_json()
+    level = layout['levels'][3]
+    assert level['width'] == ROWS_OF_CUBES * 3 * 8 == 960
+    assert (level['columns'], level['rows']) == (4, 4)
+
+    assert png_size(client.get(f'/api/mosaics/{mosaic_id}/tiles/3/0/0.png')) == (256, 256)
+    assert png_size(client.get(f'/api/mosaics/{mosaic_id}/tiles/3/3/3.png')) == (960 - 768,) * 2
+    for level, column, row in ((3, 4, 0), (3, 0, 4), (len(layout['levels']), 0, 0)):
+        assert client.get(f'/api/mosaics/{mosaic_id}/tiles/{level}/{column}/{row}.png').status_code == 404
+
+
+def test_etag_revalidation_is_304(client, mosaic_id):
+    for url in (f'/api/mosaics/{mosaic_id}/preview.png?grid=1', f'/api/mosaics/{mosaic_id}/tiles/2/0/0.png'):
+        response = client.get(url)
+        assert response.status_code == 200 and response.headers['Cache-Control'].startswith('public')
+        etag = response.headers['ETag']
+
+        cached = client.get(url, headers={'If-None-Match': etag})
+        assert cached.status_code == 304 and not cached.data
+        assert client.get(url, headers={'If-None-Match': '"other"'}).status_code == 200
+
+
+@pytest.mark.parametrize('scale', [2, 4, 8])
+def test_gridlines_close_the_right_and_bottom_border(scale):
+    result = random_result(1, cubes=3)
+    image = preview.render(result, scale, grid=True)
+    grid_index = len(result.palette_hex)
+    line = max(1, scale // 4)
+    cube = 3 * scale
+    for offset in range(0, image.shape[0], cube):
+        assert (image[offset:offset + line] == grid_index).all()
+        assert (image[:, offset:offset + line] == grid_index).all()
+    assert (image[-line:] == grid_index).all()
+    assert (image[:, -line:] == grid_index).all()
+    # Faces are only covered by lines at cube edges
+    assert (image[line:cube - line, line:cube - line] != grid_index).all()
+
+    # Tiles draw the border where it falls in the full image
+    tile = preview.render(result, scale, grid=True, top=image.shape[0] - 5, left=0, height=5, width=cube)
+    assert np.array_equal(tile, image[-5:, :cube])
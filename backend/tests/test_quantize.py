@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from optimized_mosaic_generator import OptimizedMosaicGenerator
+from tests.helpers import legacy_quantize, synthetic_image_array
+
+
+@pytest.fixture(scope='module')
+def generator():
+    return OptimizedMosaicGenerator()
+
+
+def test_vectorized_quantization_matches_per_pixel_loop(generator):
+    image_array = synthetic_image_array(12)
+    expected = legacy_quantize(generator, image_array)
+    assert np.array_equal(generator.quantize_image_array(image_array), expected)
+
+
+@pytest.mark.parametrize('workers', [2, 4])
+def test_banded_quantization_matches_serial(generator, workers):
+    image_array = synthetic_image_array(40, seed=1)
+    serial = generator.quantize_image_array(image_array, workers=1)
+
+    # Small bands, so the image is split into many of them
+    banded_generator = OptimizedMosaicGenerator(quantize_workers=workers)
+    banded_generator.BAND_PIXELS = 1 << 10
+    assert np.array_equal(banded_generator.quantize_image_array(image_array), serial)
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from app import mosaic_cache_key, read_mosaic_params
+from result_cache import MosaicResultCache
+from tests.helpers import random_result
+
+
+def test_hits_and_misses_are_counted():
+    cache = MosaicResultCache()
+    assert cache.get('a') is None
+    cache.put('a', random_result(0))
+    assert np.array_equal(cache.get('a').indices, random_result(0).indices)
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['memory_hits'], stats['misses']) == (1, 1, 1)
+
+
+def test_least_recently_used_entry_is_evicted_at_capacity():
+    entry_bytes = random_result(0).indices.nbytes
+    cache = MosaicResultCache(max_memory_bytes=entry_bytes * 2)
+    cache.put('a', random_result(0))
+    cache.put('b', random_result(1))
+    cache.get('a')
+    cache.put('c', random_result(2))
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None and cache.get('c') is not None
+    stats = cache.stats()
+    assert (stats['evictions'], stats['entries'], stats['memory_bytes']) == (1, 2, entry_bytes * 2)
+
+
+@pytest.mark.parametrize('change', [
+    {'palette': 'stickerless'},
+    {'metric': 'ciede2000'},
+    {'dither': 'bayer'},
+    {'width': '20'},
+    {'height': '20'},
+    {'contrast': '1.5'}
+])
+def test_cache_key_depends_on_every_parameter(change):
+    base = {'width': '16', 'height': '16'}
+    params = read_mosaic_params(base)
+    changed = read_mosaic_params({**base, **change})
+    key = mosaic_cache_key('digest', params, (32, 32))
+    assert key == mosaic_cache_key('digest', read_mosaic_params(base), (32, 32))
+    assert key != mosaic_cache_key('digest', changed, (32, 32))
+    assert key != mosaic_cache_key('other', params, (32, 32))
+    assert key != mosaic_cache_key('digest', params, (64, 64))
+
+
+def test_disk_tier_round_trips_across_instances(tmp_path):
+    result = random_result(3)
+    MosaicResultCache(disk_dir=str(tmp_path)).put('a', result)
+
+    cache = MosaicResultCache(disk_dir=str(tmp_path))
+    cached = cache.get('a')
+    assert np.array_equal(cached.indices, result.indices)
+    assert cached.palette_hex == result.palette_hex
+    assert (cached.width, cached.height, cached.pixel_resolution) == (4, 4, '12x12')
+    assert cache.stats()['disk_hits'] == 1
+
+    # Loaded into memory, so the next hit skips the disk
+    cache.get('a')
+    assert cache.stats()['memory_hits'] == 1
@@ -0,0 +1,30 @@
+import gzip
+import json
+import zlib
+
+import pytest
+
+import serialization
+from mosaic_result import RESULT_FORMATS, MosaicResult
+from optimized_mosaic_generator import OptimizedMosaicGenerator
+from tests.helpers import synthetic_image_array
+
+
+@pytest.fixture(scope='module')
+def result():
+    generator = OptimizedMosaicGenerator()
+    indices = generator.quantize_image_array(synthetic_image_array(10)[:, :21])
+    return MosaicResult(indices, generator.color_names, generator.palette_hex, 7, 10)
+
+
+@pytest.mark.parametrize('result_format', RESULT_FORMATS)
+def test_direct_json_matches_json_dumps(result, result_format):
+    body = serialization.json_object(serialization.encode_mosaic(result, result_format), {'mosaicId': 'abc'})
+    expected = {**result.encode(result_format), 'mosaicId': 'abc'}
+    assert json.loads(body) == json.loads(json.dumps(expected))
+
+
+def test_compression_round_trips(result):
+    body = serialization.json_object(serialization.encode_mosaic(result))
+    assert gzip.decompress(serialization.compress(body, 'gzip')) == body
+    assert zlib.decompress(serialization.compress(body, 'deflate')) == body
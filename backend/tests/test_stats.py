@@ -0,0 +1,73 @@
+from collections import Counter
+
+import numpy as np
+
+from mosaic_result import MosaicResult
+
+COLORS = 4
+
+
+def known_result():
+    """2 x 3 cubes; the first cube row has ties for the dominant color"""
+    cubes = [
+        # 5-4 split, a 3-3-3 tie, and a 4-4-1 tie between 1 and 3
+        [[0, 0, 0, 0, 0, 2, 2, 2, 2], [3, 3, 3, 1, 1, 1, 2, 2, 2], [3, 3, 3, 3, 1, 1, 1, 1, 0]],
+        # Single colors, and a 2-2-2-3 split won by the last color
+        [[1] * 9, [3] * 9, [0, 0, 1, 1, 2, 2, 3, 3, 3]]
+    ]
+    indices = np.zeros((6, 9), dtype=np.uint8)
+    for cube_y, row in enumerate(cubes):
+        for cube_x, faces in enumerate(row):
+            indices[cube_y * 3:cube_y * 3 + 3, cube_x * 3:cube_x * 3 + 3] = np.reshape(faces, (3, 3))
+    return MosaicResult(indices, list('wrgb'), ['#FFFFFF', '#FF0000', '#00FF00', '#0000FF'], 3, 2)
+
+
+def naive_stats(result):
+    """Per-cube Counters, counted face by face"""
+    cubes = {}
+    for y in range(result.height):
+        for x in range(result.width):
+            faces = result.indices[y * 3:y * 3 + 3, x * 3:x * 3 + 3].ravel().tolist()
+            cubes[y, x] = Counter(faces)
+    return cubes
+
+
+def test_bincount_stats_match_naive_counts():
+    result = known_result()
+    stats = result.stats
+    cubes = naive_stats(result)
+
+    for (y, x), counter in cubes.items():
+        assert stats.cube_counts[y, x].tolist() == [counter[color] for color in range(COLORS)]
+    for y in range(result.height):
+        row = sum((cubes[y, x] for x in range(result.width)), Counter())
+        assert stats.row_counts[y].tolist() == [row[color] for color in range(COLORS)]
+    for x in range(result.width):
+        column = sum((cubes[y, x] for y in range(result.height)), Counter())
+        assert stats.column_counts[x].tolist() == [column[color] for color in range(COLORS)]
+
+    total = Counter(result.indices.ravel().tolist())
+    assert stats.color_counts.tolist() == [total[color] for color in range(COLORS)]
+    assert result.color_count == {result.palette_hex[color]: count for color, count in total.items()}
+
+
+def test_dominant_color_breaks_ties_by_lowest_index():
+    result = known_result()
+    assert result.stats.dominant.tolist() == [[0, 1, 1], [1, 3, 3]]
+    assert result.stats.dominant_counts.tolist() == [1, 3, 0, 2]
+    assert result.dominant_grid == [['#FFFFFF', '#FF0000', '#FF0000'], ['#FF0000', '#0000FF', '#0000FF']]
+
+    # Same as max() over the counts, preferring the lowest index
+    for (y, x), counter in naive_stats(result).items():
+        expected = min(counter, key=lambda color: (-counter[color], color))
+        assert result.stats.dominant[y, x] == expected
+
+
+def test_stats_of_random_mosaic_match_naive_counts():
+    rng = np.random.default_rng(7)
+    indices = rng.integers(0, COLORS, (15, 21)).astype(np.uint8)
+    result = MosaicResult(indices, list('wrgb'), ['#FFFFFF', '#FF0000', '#00FF00', '#0000FF'], 7, 5)
+    for (y, x), counter in naive_stats(result).items():
+        assert result.stats.cube_counts[y, x].tolist() == [counter[color] for color in range(COLORS)]
+        assert result.stats.dominant[y, x] == min(counter, key=lambda color: (-counter[color], color))
+    assert result.stats.row_counts.sum() == result.stats.column_counts.sum() == indices.size
@@ -1,4 +1,4 @@
-import React from 'react';
+import React, { useRef } from 'react';
 import axios from 'axios';
 import './MosaicControls.css';
 
@@ -24,28 +24,52 @@ const MosaicControls = ({
     });
   };
 
+  // Server-side working copy of the current image, reused on regenerate
+  const upload = useRef({ image: null, uploadId: null });
+
+  const requestMosaic = (source) => {
+    const formData = new FormData();
+    if (source.uploadId) {
+      formData.append('uploadId', source.uploadId);
+    } else {
+      formData.append('image', source.blob, 'image.jpg');
+    }
+    formData.append('width', settings.width);
+    formData.append('height', settings.height);
+    
+    // The preview is rendered server-side, so fetch the compact encoding
+    // rather than one hex string per face
+    return axios.post('/api/generate-mosaic?format=rle', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+  };
+
   const generateMosaic = async () => {
     if (!uploadedImage) return;
     
     setLoading(true);
     try {
-      // Convert data URL to blob
-      const response = await fetch(uploadedImage);
-      const blob = await response.blob();
+      let result = null;
       
-      // Create FormData
-      const formData = new FormData();
-      formData.append('image', blob, 'image.jpg');
-      formData.append('width', settings.width);
-      formData.append('height', settings.height);
+      // Skip re-uploading and decoding an image the server still has
+      if (upload.current.image === uploadedImage && upload.current.uploadId) {
+        try {
+          result = await requestMosaic({ uploadId: upload.current.uploadId });
+        } catch (error) {
+          if (error.response?.status !== 404) throw error;
+        }
+      }
       
-      // Send to backend
-      const result = await axios.post('/api/generate-mosaic', formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-      });
+      if (!result) {
+        // Convert data URL to blob
+        const response = await fetch(uploadedImage);
+        const blob = await response.blob();
+        result = await requestMosaic({ blob });
+      }
       
+      upload.current = { image: uploadedImage, uploadId: result.data.uploadId || null };
       onMosaicGenerated(result.data);
     } catch (error) {
       console.error('Error generating mosaic:', error);
@@ -5,12 +5,26 @@ import './MosaicDisplay.css';
 const MosaicDisplay = ({ mosaicData, settings }) => {
   const downloadPDF = async () => {
     try {
-      const response = await axios.post('/api/generate-pdf', {
-        mosaicData: mosaicData,
+      const requestPDF = (payload) => axios.post('/api/generate-pdf', {
+        ...payload,
         settings: settings
       }, {
         responseType: 'blob'
       });
+
+      // Reference the server-side result; fall back to posting the grid
+      // if it has expired
+      let response;
+      try {
+        response = mosaicData.mosaicId
+          ? await requestPDF({ mosaicId: mosaicData.mosaicId })
+          : await requestPDF({ mosaicData: mosaicData });
+      } catch (error) {
+        if (!mosaicData.mosaicId || error.response?.status !== 404) {
+          throw error;
+        }
+        response = await requestPDF({ mosaicData: mosaicData });
+      }
       
       // Create download link
       const url = window.URL.createObjectURL(new Blob([response.data]));
@@ -59,21 +73,30 @@ const MosaicDisplay = ({ mosaicData, settings }) => {
           </p>
         </div>
         
-        <div className="mosaic-grid" style={{
-          gridTemplateColumns: `repeat(${mosaicData.dimensions?.display_width || settings.width * 3}, 1fr)`,
-          gridTemplateRows: `repeat(${mosaicData.dimensions?.display_height || settings.height * 3}, 1fr)`
-        }}>
-          {mosaicData.grid && mosaicData.grid.map((row, rowIndex) =>
-            row.map((faceColor, colIndex) => (
-              <div
-                key={`${rowIndex}-${colIndex}`}
-                className="face-cell"
-                style={{ backgroundColor: faceColor }}
-                title={`Face: ${getRubikColorName(faceColor)}`}
-              />
-            ))
-          )}
-        </div>
+        {mosaicData.mosaicId ? (
+          // Rendered server-side from the index array and cached by the browser
+          <img
+            className="mosaic-preview"
+            src={`/api/mosaics/${mosaicData.mosaicId}/preview.png?grid=1`}
+            alt="Mosaic preview"
+          />
+        ) : (
+          <div className="mosaic-grid" style={{
+            gridTemplateColumns: `repeat(${mosaicData.dimensions?.display_width || settings.width * 3}, 1fr)`,
+            gridTemplateRows: `repeat(${mosaicData.dimensions?.display_height || settings.height * 3}, 1fr)`
+          }}>
+            {mosaicData.grid && mosaicData.grid.map((row, rowIndex) =>
+              row.map((faceColor, colIndex) => (
+                <div
+                  key={`${rowIndex}-${colIndex}`}
+                  className="face-cell"
+                  style={{ backgroundColor: faceColor }}
+                  title={`Face: ${getRubikColorName(faceColor)}`}
+                />
+              ))
+            )}
+          </div>
+        )}
       </div>
       
       {mosaicData.colorCount && (